@@ -0,0 +1,47 @@
+from games.kuhn import build_kuhn_tree
+from games.leduc import build_leduc_tree
+from games.goofspiel import build_goofspiel_tree, TieSolver
+
+from data_structures.cfr_trees import CFRTree
+from cfr_code.cfr import CFRIteration
+
+import time
+import argparse
+
+parser = argparse.ArgumentParser(description='time per iteration of the recursive CFR traversals')
+
+parser.add_argument('game', type=str, help='type of game instance (kuhn, leduc, goofspiel)', choices=['kuhn','leduc','goofspiel'])
+
+parser.add_argument('--players', '-p', type=int, default=4, help='number of players')
+parser.add_argument('--rank', '-r', type=int, default=5, help='rank of the game')
+parser.add_argument('--suits', '-s', type=int, default=3, help='number of suits (only for leduc')
+parser.add_argument('--betting_parameters', '-bp', type=int, default=[2,4], nargs='*', help='betting parameters (only for leduc')
+parser.add_argument('--number_iterations', '-t', type=int, default=20, help='number of timed iterations per repetition')
+parser.add_argument('--repetitions', '-n', type=int, default=3, help='number of repetitions (the fastest one is reported)')
+
+args = parser.parse_args()
+
+def build_base_tree():
+    if args.game == 'kuhn':
+        return build_kuhn_tree(args.players, args.rank)
+    if args.game == 'leduc':
+        return build_leduc_tree(args.players, args.suits, args.rank, args.betting_parameters)
+    return build_goofspiel_tree(args.players, args.rank, TieSolver.Accumulate)
+
+cfr_tree = CFRTree(build_base_tree())
+
+timings = {}
+for (mode, alternating_updates) in [('all players', False), ('alternating', True)]:
+    best = None
+    for _ in range(args.repetitions):
+        start_time = time.perf_counter()
+        for _ in range(args.number_iterations):
+            CFRIteration(cfr_tree, alternating_updates = alternating_updates)
+            cfr_tree.updateCurrentStrategies()
+        elapsed = (time.perf_counter() - start_time) / args.number_iterations
+        best = elapsed if best == None else min(best, elapsed)
+    timings[mode] = best
+    print("CFR iteration ({}): {:.4f}s".format(mode, best))
+
+print("Speedup of the single traversal over alternating updates: {:.2f}x ({} players)"
+      .format(timings['alternating'] / timings['all players'], cfr_tree.numOfPlayers))
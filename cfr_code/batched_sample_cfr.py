@@ -0,0 +1,140 @@
+import numpy as np
+from data_structures import sampling
+
+class BatchedSampleCFR:
+    """
+    SCFR run over the flat representation of a CFRTree, with several action plans sampled at each iteration.
+    Each iteration draws a (batch_size, infosets) matrix of action plans from the current strategies and, for each
+    plan and each player, an independent outcome of every chance node. The batch_size * numOfPlayers traversals
+    of sampleCFR are then replayed at once: reach indicators top-down, values of the sampled plays bottom-up. The
+    regret (CFR+) and strategy updates are averaged over the batch before being applied to the InfosetTable.
+    """
+
+    def __init__(self, cfr_tree, batch_size):
+        """
+        Create the engine for the given CFRTree, sampling batch_size action plans per iteration.
+        """
+
+        self.cfr_tree = cfr_tree
+        self.flat_tree = cfr_tree.getFlatTree()
+        self.infoset_table = cfr_tree.infoset_table
+        self.batch_size = batch_size
+
+        flat = self.flat_tree
+        self.visits = np.array([n.visits for n in flat.nodes], dtype = float)
+
+        self.decision_nodes = np.nonzero(flat.infoset >= 0)[0]
+
+        # Decision edges of each player, with the (infoset, action) cell they belong to
+        e = flat.decision_edges
+        self.player_edges = []
+        self.player_edge_cells = []
+        for p in range(flat.numOfPlayers):
+            edges = e[flat.edge_player[e] == p]
+            self.player_edges.append(edges)
+            self.player_edge_cells.append(flat.cell(flat.edge_infoset[edges].astype(np.int64),
+                                                    flat.incoming_action[edges]))
+        self.cell_count = flat.infoset_count * flat.max_action_count
+
+    def samplePlans(self):
+        """
+        Sample a (batch_size, infosets) matrix of action plans from the current strategies.
+        """
+
+        table = self.infoset_table
+        return sampling.sampleRowsFromCDFs(table.strategy_cdf, self.batch_size, table.last_action).astype(np.int32)
+
+    def sampleChanceOutcomes(self, count):
+        """
+        Sample count independent outcomes of every chance node, as a (count, chance nodes) matrix of actions.
+        """
+
+        flat = self.flat_tree
+        return sampling.sampleRowsFromCDFs(flat.chance_cdf, count, flat.chance_last_action)
+
+    def iteration(self):
+        """
+        Run one batched SCFR iteration for all the players, updating cumulative regrets and strategies (but not the
+        current strategy). Returns the sampled (batch_size, infosets) matrix of action plans.
+        """
+
+        flat = self.flat_tree
+        table = self.infoset_table
+        K = self.batch_size
+        n_players = flat.numOfPlayers
+        n = flat.node_count
+
+        plans = self.samplePlans()
+
+        # Action played at each internal node in the traversal of each (plan, player)
+        action = np.zeros((K, n_players, n), dtype = np.int64)
+        action[:, :, self.decision_nodes] = plans[:, None, flat.infoset[self.decision_nodes]]
+        action[:, :, flat.chance_nodes] = self.sampleChanceOutcomes(K * n_players).reshape(K, n_players, -1)
+
+        # Whether each decision edge is the one selected by the plan
+        e = flat.decision_edges
+        plan_edge = np.ones((K, n), dtype = bool)
+        plan_edge[:, e] = plans[:, flat.edge_infoset[e]] == flat.incoming_action[e]
+
+        # Top-down: nodes visited by each traversal (only the sampled outcome of chance is followed) and whether each
+        # player followed the plan up to each node
+        visited = np.ones((K, n_players, n), dtype = bool)
+        follow = np.ones((K, n_players, n), dtype = bool)
+        for d in range(1, flat.max_depth + 1):
+            lo, hi = flat.levelRange(d)
+            parent = flat.parent[lo:hi]
+            chance_edge = flat.is_chance[parent]
+            sampled = action[:, :, parent] == flat.incoming_action[lo:hi]
+            visited[:, :, lo:hi] = visited[:, :, parent] & (~chance_edge | sampled)
+            acting = flat.edge_player[lo:hi][None, :] == np.arange(n_players)[:, None]
+            follow[:, :, lo:hi] = follow[:, :, parent] & (~acting | plan_edge[:, None, lo:hi])
+
+        follow_count = follow.sum(axis = 1)
+        all_follow = follow_count == n_players
+
+        # Bottom-up: value for the traversing player of following the plan (and the sampled chance) from each node
+        values = np.zeros((K, n_players, n))
+        values[:, :, flat.leaves] = flat.leaf_utility.T[None, :, :]
+        values = values.reshape(K * n_players, n)
+        action = action.reshape(K * n_players, n)
+        for d in range(flat.max_depth - 1, -1, -1):
+            internal = flat.level_internal_nodes[d]
+            if(len(internal) == 0):
+                continue
+            chosen = flat.child_offset[internal] + action[:, internal]
+            values[:, internal] = np.take_along_axis(values, chosen, axis = 1)
+        values = values.reshape(K, n_players, n)
+
+        self.visits += (visited & all_follow[:, None, :]).sum(axis = (0, 1)) / K
+
+        regret = np.zeros(self.cell_count)
+        strategy = np.zeros(self.cell_count)
+        flat_strategy = table.current_strategy.reshape(-1)
+        for p in range(n_players):
+            edges = self.player_edges[p]
+            cells = self.player_edge_cells[p]
+            parent = flat.parent[edges]
+            visited_p = visited[:, p, parent]
+
+            # The other players followed the plan up to the parent node
+            others_follow = (follow_count[:, parent] - follow[:, p, parent]) == n_players - 1
+            contribution = (visited_p & others_follow) * (values[:, p, edges] - values[:, p, parent])
+            regret += np.bincount(cells, weights = contribution.sum(axis = 0), minlength = self.cell_count)
+
+            self_follow = (visited_p & follow[:, p, parent]).sum(axis = 0)
+            strategy += np.bincount(cells, weights = self_follow * flat_strategy[cells], minlength = self.cell_count)
+
+        shape = table.cumulative_regret.shape
+        table.cumulative_regret += regret.reshape(shape) / K
+        np.maximum(table.cumulative_regret, 0, out = table.cumulative_regret)
+        table.cumulative_strategy += strategy.reshape(shape) / K
+
+        return plans
+
+    def writeBack(self):
+        """
+        Copy the visits back into the nodes of the CFRTree (regrets and strategies already live in its InfosetTable).
+        """
+
+        for (node, visits) in zip(self.flat_tree.nodes, self.visits.tolist()):
+            node.visits = visits
@@ -1,35 +1,48 @@
-from functools import reduce
+from cfr_code.vectorized_cfr import VectorizedCFR
+import math
 import time
 
-def CFR(node, player, pi, use_cfr_plus = False):
+# (alpha, beta, gamma) discounting parameters of Linear CFR and of the recommended Discounted CFR variant
+LINEAR_CFR_DISCOUNT = (1, 1, 1)
+DCFR_DISCOUNT = (1.5, 0, 2)
+
+def CFR(node, player, pi, rows, use_cfr_plus = False, prune = False, strategy_weight = 1):
     """
     Vanilla CFR algorithm.
+    rows holds the (cumulative_regret, cumulative_strategy, current_strategy) lists of each information set, by table
+    row, as returned by InfosetTable.rowLists.
+    The contributions to the cumulative strategy of player are multiplied by strategy_weight.
+    If prune is True, the subtrees below actions that the other players play with probability zero (i.e. with no
+    positive cumulative regret) are skipped: the regrets of player cannot change there, as its counterfactual reach is
+    zero. The contributions to its cumulative strategy are lost, so strategy_weight should be 0 (see CFRIteration).
     """
 
-    n_players = len(pi)
-    node.visits += reduce(lambda x, y: x * y, pi, 1)
+    node.visits += math.prod(pi)
 
     if node.isChance():
         res = 0
         for (p, child) in zip (node.distribution, node.children):
-            res += CFR(child, player, pi, use_cfr_plus) * p
+            res += CFR(child, player, pi, rows, use_cfr_plus, prune, strategy_weight) * p
         return res
     
     if(node.isLeaf()):
         return node.utility[player]
     
     iset = node.information_set
+    (regret, cumulative_strategy, strategy) = rows[iset.table_row]
     v = 0
     v_alt = [0 for a in node.children]
     
     for a in range(len(node.children)):
+        if(prune and iset.player != player and strategy[a] == 0):
+            continue
         
         old_pi = pi[iset.player]
-        pi[iset.player] *= iset.current_strategy[a]
-        v_alt[a] = CFR(node.children[a], player, pi)        
+        pi[iset.player] *= strategy[a]
+        v_alt[a] = CFR(node.children[a], player, pi, rows, prune = prune, strategy_weight = strategy_weight)
         pi[iset.player] = old_pi
             
-        v += v_alt[a] * iset.current_strategy[a]
+        v += v_alt[a] * strategy[a]
     
     if(iset.player == player):
         pi_other = 1
@@ -39,38 +52,162 @@ def CFR(node, player, pi, use_cfr_plus = False):
 
         for a in range(len(node.children)):
             if use_cfr_plus:
-                #iset.cumulative_regret[a] += pi[player] * max(0, (v_alt[a] - v)) # CFR+
-                iset.cumulative_regret[a] = max(iset.cumulative_regret[a] + pi_other * (v_alt[a] - v), 0)
+                #regret[a] += pi[player] * max(0, (v_alt[a] - v)) # CFR+
+                regret[a] = max(regret[a] + pi_other * (v_alt[a] - v), 0)
             else:
-                #iset.cumulative_regret[a] += pi[player] * (v_alt[a] - v)
-                iset.cumulative_regret[a] += pi_other * (v_alt[a] - v)
-            iset.cumulative_strategy[a] += pi[player] * iset.current_strategy[a]
+                #regret[a] += pi[player] * (v_alt[a] - v)
+                regret[a] += pi_other * (v_alt[a] - v)
+            cumulative_strategy[a] += strategy_weight * pi[player] * strategy[a]
     
     return v
 
+def CFRAllPlayers(node, pi, rows, use_cfr_plus = False, prune = False, strategy_weight = 1):
+    """
+    Vanilla CFR algorithm, updating the regrets of all the players in a single traversal.
+    Returns the vector containing the value of each player at the given node.
+    rows holds the lists of each information set and strategy_weight multiplies the contributions to the cumulative
+    strategies, as in CFR.
+    If prune is True, the subtrees reached with probability zero by at least two players (the acting one by playing an
+    action with probability zero) are skipped, as the counterfactual reach of every player is zero there. As in CFR,
+    the contributions to the cumulative strategies are lost, so strategy_weight should be 0.
+    """
+
+    n_players = len(pi)
+    node.visits += n_players * math.prod(pi)
+
+    if node.isChance():
+        res = [0] * n_players
+        for (p, child) in zip(node.distribution, node.children):
+            child_v = CFRAllPlayers(child, pi, rows, use_cfr_plus, prune, strategy_weight)
+            for i in range(n_players):
+                res[i] += child_v[i] * p
+        return res
+
+    if(node.isLeaf()):
+        return node.utility
+
+    iset = node.information_set
+    player = iset.player
+    (regret, cumulative_strategy, strategy) = rows[iset.table_row]
+    v = [0] * n_players
+    v_alt = [0 for a in node.children]
+
+    pi_other = 1
+    for i in range(n_players):
+        if(i != player):
+            pi_other *= pi[i]
+
+    for a in range(len(node.children)):
+        if(prune and pi_other == 0 and pi[player] * strategy[a] == 0):
+            continue
+
+        old_pi = pi[player]
+        pi[player] *= strategy[a]
+        child_v = CFRAllPlayers(node.children[a], pi, rows, use_cfr_plus, prune, strategy_weight)
+        pi[player] = old_pi
+
+        v_alt[a] = child_v[player]
+        for i in range(n_players):
+            v[i] += child_v[i] * strategy[a]
+
+    for a in range(len(node.children)):
+        if use_cfr_plus:
+            regret[a] = max(regret[a] + pi_other * (v_alt[a] - v[player]), 0)
+        else:
+            regret[a] += pi_other * (v_alt[a] - v[player])
+        cumulative_strategy[a] += strategy_weight * pi[player] * strategy[a]
+
+    return v
+
+def CFRIteration(cfr_tree, use_cfr_plus = False, alternating_updates = False, prune = False, strategy_weight = 1):
+    """
+    Run one iteration of CFR for all the players of the given tree, without updating the current strategies.
+    If alternating_updates is True, the tree is traversed once per player; otherwise all the players are updated
+    in a single traversal.
+    The contributions to the cumulative strategies are multiplied by strategy_weight.
+    If prune is True, subtrees that cannot change any regret are skipped (see CFR and CFRAllPlayers), and the
+    cumulative strategies are not updated at all (strategy_weight is ignored); see pruningSchedule.
+    The traversals work on Python lists copied from the InfosetTable of the tree, which are much faster to index one
+    element at a time than its arrays, and the results are copied back into the table at the end.
+    """
+
+    player_count = cfr_tree.numOfPlayers
+    table = cfr_tree.infoset_table
+    rows = table.rowLists()
+    if(prune):
+        strategy_weight = 0
+
+    if(alternating_updates):
+        for p in range(player_count):
+            CFR(cfr_tree.root, p, [1] * player_count, rows, use_cfr_plus, prune, strategy_weight)
+    else:
+        CFRAllPlayers(cfr_tree.root, [1] * player_count, rows, use_cfr_plus, prune, strategy_weight)
+
+    table.storeRowLists(rows)
+
+def pruningSchedule(i, regret_pruning, full_pass_every_iteration):
+    """
+    Returns the (prune, strategy_weight) arguments of CFRIteration for iteration i (starting from 1).
+    With regret_pruning, every full_pass_every_iteration-th iteration is a full traversal and the others are pruned.
+    The cumulative strategies are only updated on the full passes, with weight full_pass_every_iteration, so that the
+    average strategy is rebuilt from one sample of the current strategies per period, including inside the subtrees
+    skipped by the pruned iterations (the iterations after the last full pass are not part of it).
+    """
+
+    if(not regret_pruning):
+        return (False, 1)
+    if(i % full_pass_every_iteration != 0):
+        return (True, 0)
+    return (False, full_pass_every_iteration)
+
 def SolveWithCFR(cfr_tree, iterations, perc = 10, show_perc = True, checkEveryIteration = -1, 
-                 check_callback = None, use_cfr_plus = False):
+                 check_callback = None, use_cfr_plus = False, vectorized = False, alternating_updates = False,
+                 regret_pruning = False, full_pass_every_iteration = 10, discount = None):
+    """
+    Run CFR (or CFR+) on a given tree for a given amount of iterations.
+    If vectorized is True, the iterations are run by VectorizedCFR over the flat representation of the tree, instead
+    of recursively over its nodes.
+    If alternating_updates is True, the recursive engine traverses the tree once per player at each iteration,
+    instead of updating all the players in a single traversal.
+    If regret_pruning is True, the recursive engine skips the subtrees below the actions played with probability zero
+    by the opponents of the updated player (see CFR); every full_pass_every_iteration iterations a full traversal is
+    run instead, and the average strategy is only accumulated on those (see pruningSchedule). The vectorized engine
+    does not support pruning.
+    If discount is an (alpha, beta, gamma) tuple, regrets and cumulative strategies are discounted after each iteration
+    as in Discounted CFR (e.g. LINEAR_CFR_DISCOUNT for Linear CFR, DCFR_DISCOUNT for DCFR).
+    """
+
     # Graph data
     graph_data = []
 
     start_time = time.time()
     last_checkpoint_time = start_time
 
-    player_count = cfr_tree.numOfPlayers
+    if(vectorized and regret_pruning):
+        raise Exception("ERROR: regret pruning is not supported by the vectorized engine")
+
+    engine = VectorizedCFR(cfr_tree, use_cfr_plus) if vectorized else None
 
     for i in range(1, iterations + 1):
         if(show_perc and i % (iterations / 100 * perc) == 0):
             print(str(i / (iterations / 100 * perc) * perc) + "%")
 
         # Run CFR for each player
-        for p in range(player_count):
-            CFR(cfr_tree.root, p, [1] * player_count, use_cfr_plus)
-            
+        if(vectorized):
+            engine.iteration()
+        else:
+            (prune, strategy_weight) = pruningSchedule(i, regret_pruning, full_pass_every_iteration)
+            CFRIteration(cfr_tree, use_cfr_plus, alternating_updates, prune, strategy_weight)
+
+        if(discount != None):
+            cfr_tree.infoset_table.discount(i, *discount)
+
         # Update the current strategy for each information set
-        for infoset in cfr_tree.information_sets.values():
-            infoset.updateCurrentStrategy()
+        cfr_tree.updateCurrentStrategies()
 
         if(checkEveryIteration > 0 and i % checkEveryIteration == 0):
+            if(vectorized):
+                engine.writeBack()
             data = {'epsilon': cfr_tree.checkMarginalsEpsilon(),
                     'iteration_number': i,
                     'duration': time.time() - last_checkpoint_time,
@@ -82,11 +219,13 @@ def SolveWithCFR(cfr_tree, iterations, perc = 10, show_perc = True, checkEveryIt
                 
             last_checkpoint_time = time.time()
         # print('test:', time.time() - start_time)
+    if(vectorized):
+        engine.writeBack()
     ans = []
     for id in cfr_tree.information_sets:
         # print(icfr_tree.information_sets[id].nodes[0].base_node.seq, icfr_tree.information_sets[id].inRM.getStrategy().reshape(-1).tolist())
-        ans.append('{:>4s}'.format(cfr_tree.information_sets[id].nodes[0].base_node.seq) + ' ' + 
-            str([cfr_tree.information_sets[id].nodes[0].base_node.actionNames[i] for i in range(cfr_tree.information_sets[id].action_count)]) + ' ' + str(
+        ans.append('{:>4s}'.format(cfr_tree.information_sets[id].label) + ' ' + 
+            str(cfr_tree.information_sets[id].action_names) + ' ' + str(
             (cfr_tree.information_sets[id].getAverageStrategy())))
     for i in sorted(ans):
         print(i)
@@ -7,9 +7,9 @@ from venv import create
 
 from cv2 import norm
 from cfr_code.cfr import CFR
-from data_structures.regret_minimizers import InternalRM, ExternalRM
+from cfr_code.icfr_epsilons import ICFREpsilonEvaluator
+from data_structures import sampling
 import time
-import random
 import matplotlib.pyplot as plt
 import numpy as np
 # from utilities.drawing import draw_tree
@@ -74,134 +74,112 @@ def addMerge(d1, d2):
 #     return epsilon
 """
 def getEpsilon(tree: CFRTree, node: CFRNode, t):
-    epsilon = {}
-    if (node.isChance()):
-        for a in range(len(node.children)):
-            epsilon = addMerge(epsilon, getEpsilon(tree, node.children[a], t))
-        return epsilon
-
-    iset = node.information_set
-    player = iset.player
-    eps = -1
-    for a in range(len(node.children)):
-        LatteU = node.getLatter(t, tree, a, player)
-        num_mu = 5
-        while (num_mu):
-            normalizingsum = random.random()
-            for string in tree.actionPlan:
-                r = random.random()
-                tree.actionPlan[string][1] = r
-                normalizingsum += r
-            for string in tree.actionPlan:
-                tree.actionPlan[string][1] /= normalizingsum
-            eps = max(node.getExpectedDeviatedUtility(t, a, tree, player) - LatteU, eps)
-            num_mu -= 1
-    epsilon[iset.id] = eps
-    return epsilon
+    """
+    Returns a dict with the epsilon of the information set of each of the first decision nodes from the given one,
+    after t iterations (see ICFREpsilonEvaluator).
+    """
+    if (tree.icfr_epsilon_evaluator is None):
+        tree.icfr_epsilon_evaluator = ICFREpsilonEvaluator(tree)
+    return tree.icfr_epsilon_evaluator.epsilons(t, node)
 # ok
-def init(node, player_count: int):
-    PLAYER_COUNT = player_count
-    if (node.isChance()):
-        for child in node.children:
-            init(child, player_count)
-        return
-    if (node.isLeaf()):
-        node.reachability = [False] * PLAYER_COUNT
-        return
-    iset = node.information_set
-    iset.externalsigma = ""
-    iset.tag = False
-    iset.update = False
-    iset.action = -1
-    iset.reachability = -1
-    # iset.utility = [0] * len(node.children)
-    iset.utility = np.zeros(len(node.children))
-    iset.imm_utility = np.zeros(len(node.children))
-    for a in range(len(node.children)):
-        init(node.children[a], player_count)
+def initBuffers(tree: CFRTree):
+    """
+    Allocate the tree-wide utility buffers of ICFR, making utility and imm_utility of each information set views on
+    its row.
+    """
+    shape = (len(tree.information_sets), tree.infoset_table.max_action_count)
+    tree.icfr_utility = np.zeros(shape)
+    tree.icfr_imm_utility = np.zeros(shape)
+    for iset in tree.information_sets.values():
+        iset.utility = tree.icfr_utility[iset.index, :iset.action_count]
+        iset.imm_utility = tree.icfr_imm_utility[iset.index, :iset.action_count]
+
+def init(tree: CFRTree):
+    """
+    Start a new ICFR iteration: the per-iteration fields of all the information sets become stale (see
+    refreshInfoset) and the utility buffers are zeroed.
+    """
+    if (tree.icfr_utility is None):
+        initBuffers(tree)
+    tree.icfr_epoch += 1
+    tree.icfr_utility.fill(0)
+    tree.icfr_imm_utility.fill(0)
+
+def refreshInfoset(iset: CFRInformationSet):
+    """
+    Clear the per-iteration fields of an information set if they were written in an earlier iteration.
+    """
+    epoch = iset.cfr_tree.icfr_epoch
+    if (iset.epoch != epoch):
+        iset.epoch = epoch
+        iset.external_id = -1
+        iset.tag = False
+        iset.update = False
+        iset.action = -1
+        iset.reachability = -1
 # ok
-def createExternalRM(node, exiset):
-    if (node.isLeaf()):
-        return
-    iset = node.information_set
-    if exiset.player == iset.player:
-        iset.reachability = 0
-        iset.externalsigma = exiset.externalsigma
-        if (exiset.externalsigma + '.' + str(iset.id) not in iset.exRM.keys()):
-            iset.exRM[exiset.externalsigma + '.' + str(iset.id)] = ExternalRM(iset.action_count)
-    for a in range(len(node.children)):
-        createExternalRM(node.children[a], exiset)
+def createExternalRM(node, exiset, bank):
+    """
+    Make the information sets of the player of exiset below the given node use the external regret minimizer of the
+    trigger (exiset, exiset.action). The subtree is visited depth-first with an explicit stack.
+    """
+    stack = [node]
+    while (len(stack) > 0):
+        node = stack.pop()
+        if (node.isLeaf()):
+            continue
+        if (not node.isChance()):
+            iset = node.information_set
+            if exiset.player == iset.player:
+                refreshInfoset(iset)
+                iset.reachability = 0
+                iset.external_id = bank.externalId(exiset.index, exiset.action, iset.index)
+        stack.extend(reversed(node.children))
 # ok
-def ICFR_sampling(node):
+def ICFR_sampling(node, action_plan):
     """
     ICFR sampling algorithm.
+    The sampled actions are written into action_plan (an array indexed by the dense index of the information sets),
+    which is also returned. The nodes are visited depth-first with an explicit stack, in the same order as a recursive
+    visit, so that the random draws happen in the same order.
     """
-    action_plan = {}
-    if node.isChance():
-        for child in node.children:
-            ac = ICFR_sampling(child)
-            action_plan = Merge(action_plan, ac)
-        return action_plan
-    
-    if (node.isLeaf()):
-        return {}
-    iset = node.information_set
-    if (iset.reachability == 1):
-        action_plan[iset.id] = iset.action
-        for a in range(len(node.children)):
-            ac = ICFR_sampling(node.children[a])
-            action_plan = Merge(action_plan, ac)
-        return action_plan
+    stack = [node]
+    while (len(stack) > 0):
+        node = stack.pop()
+        if (node.isLeaf()):
+            continue
+        stack.extend(reversed(node.children))
+        if (node.isChance()):
+            continue
 
-    elif (iset.reachability == -1):
-        iset.reachability = 1
-        sampledAction = iset.inRM.recommend()
-        iset.action = sampledAction
-        iset.externalsigma = str(iset.id) + '.' + str(sampledAction)
-        for a in range(len(node.children)):
-            if (a != sampledAction):
-                createExternalRM(node.children[a], iset)
-    else:
-        if (not iset.tag):
-            sampledAction = iset.exRM[iset.externalsigma + '.' + str(iset.id)].recommend()
+        iset = node.information_set
+        refreshInfoset(iset)
+        if (iset.reachability == 1):
+            action_plan[iset.index] = iset.action
+            continue
+
+        elif (iset.reachability == -1):
+            iset.reachability = 1
+            bank = iset.cfr_tree.getRegretMinimizerBank()
+            sampledAction = bank.recommendInternal(iset.index)
             iset.action = sampledAction
-        
-    if (not iset.tag):
-        action_plan[iset.id] = sampledAction
-        iset.action = sampledAction
-        iset.mu_T[sampledAction] = iset.mu_T[sampledAction] + 1
-        iset.tag = True
+            for a in range(len(node.children)):
+                if (a != sampledAction):
+                    createExternalRM(node.children[a], iset, bank)
+        else:
+            if (not iset.tag):
+                sampledAction = iset.cfr_tree.getRegretMinimizerBank().recommendExternal(iset.external_id)
+                iset.action = sampledAction
 
-    for a in range(len(node.children)):
-        ac = ICFR_sampling(node.children[a])
-        action_plan = Merge(action_plan, ac)
+        if (not iset.tag):
+            action_plan[iset.index] = sampledAction
+            iset.action = sampledAction
+            iset.mu_T[sampledAction] = iset.mu_T[sampledAction] + 1
+            iset.tag = True
     return action_plan
 
-def calcReachability(node: CFRNode, reachability: list):
-    if node.isLeaf():
-        node.reachability = reachability.copy()
-        return
-    if node.isChance():
-        for child in node.children:
-            calcReachability(child, reachability.copy())
-        return
-
-    iset = node.information_set
-    for a in range(len(node.children)):
-        if a == iset.action:
-            calcReachability(node.children[a], reachability.copy())
-        else:
-            new_reachablity = reachability.copy()
-            new_reachablity[iset.player] = False
-            calcReachability(node.children[a], new_reachablity)
-
 def sampleAction(s):
-    r = random.random()
-    count = 0
-    for i in range(len(s)):
-        count += s[i]
-        if (r < count):
-            return i
+    return sampling.sampleFromCDF(sampling.buildCDF(s))
 
 # def ICFR_trigger(node):
 #     action_plan = {}
@@ -252,53 +230,54 @@ def renewVisits(node, action_plan):
 #         action_plan[iset.id] = sampledAction
 #         ICFR_Observe(node.children[a], action_plan)
 # ???
-def ICFR_Update(node):
-    if (node.isChance()):
-        for child in node.children:
-            ICFR_Update(child)
-        # ICFR_Update(node.children[node.action])
-        return
-    if (node.isLeaf()):
-        return
-    iset = node.information_set
-    if (iset.update is False):
+def ICFR_Update(tree: CFRTree):
+    """
+    Make the regret minimizer used by each information set in this iteration observe its utilities: the internal one
+    if the information set was reachable, the external one of its trigger otherwise.
+    """
+    internal_rows = []
+    external_ids = []
+    for iset in tree.information_sets.values():
         if (iset.reachability):
-            iset.inRM.observe(iset.utility)
+            internal_rows.append(iset.index)
         else:
-            iset.exRM[iset.externalsigma + '.' + str(iset.id)].observe(iset.utility)
-        iset.update = True
-        for a in range(len(node.children)):
-            ICFR_Update(node.children[a])
-    else:
-        for a in range(len(node.children)):
-            ICFR_Update(node.children[a])
+            external_ids.append(iset.external_id)
+    tree.getRegretMinimizerBank().observe(internal_rows, external_ids, tree.icfr_utility)
 
 
-def get_imm_utility(tree: CFRTree):
-    for iset_id in tree.information_sets: # iset: CFRInformationset
-        iset = tree.information_sets[iset_id]
-        for a in range(iset.action_count):
-            leaves = iset.getChildrenLeaves(a)
-            for leaf in leaves:
-                assert leaf.isLeaf()
-                reachability = leaf.reachability.copy()
-                reachability[iset.player] = True
-                if reduce(lambda x,y : x and y, reachability, True):
-                    iset.imm_utility[a] += leaf.utility[iset.player] / len(tree.root.children)
-
-def get_cum_utility(iset: CFRInformationSet, action: int, action_plan: dict):
-    utility = iset.imm_utility[action]
-    childInfosets = iset.getChildrenInformationSets(action)
-    for childInfoset in childInfosets:
-        utility += get_cum_utility(childInfoset, action_plan[iset.id], action_plan)
-    return utility
+def get_imm_utility(tree: CFRTree, action_plan: np.ndarray):
+    """
+    Add to the immediate utility of each (infoset, action) cell the utility of the leaves directly reachable by it
+    that the other players reach when they follow the action plan.
+    """
+    flat = tree.getFlatTree()
+    others_follow = flat.plansLeafReach(action_plan[None, :])[0]
+    leaves = flat.sequence_leaves
+    cells = flat.sequence_leaf_cells
+    players = flat.infoset_player[cells // flat.max_action_count]
+    weights = others_follow[players, leaves] * (flat.leaf_utility[leaves, players] / len(tree.root.children))
+    imm_utility = np.bincount(cells, weights = weights, minlength = tree.icfr_imm_utility.size)
+    tree.icfr_imm_utility += imm_utility.reshape(tree.icfr_imm_utility.shape)
 
-def get_utility(tree: CFRTree, action_plan: dict):
-    get_imm_utility(tree)
-    for iset_id in tree.information_sets: # iset: CFRInformationset
-        iset = tree.information_sets[iset_id]
-        for a in range(iset.action_count):
-            iset.utility[a] += get_cum_utility(iset, a, action_plan)
+def get_utility(tree: CFRTree, action_plan: np.ndarray):
+    """
+    Add to the utility of each (infoset, action) cell its immediate utility plus the cumulative utility of its child
+    information sets, where the cumulative utility of a child is the one of the action its parent plays in the plan.
+    The cumulative utilities are computed once per information set, in a single bottom-up pass.
+    """
+    get_imm_utility(tree, action_plan)
+    flat = tree.getFlatTree()
+    imm_utility = tree.icfr_imm_utility
+    # Sum of the cumulative utilities of the child information sets of each cell
+    children_utility = np.zeros_like(imm_utility)
+    for level in reversed(flat.sequence_levels):
+        parent = flat.infoset_parent[level]
+        if (parent[0] < 0):
+            continue
+        action = action_plan[parent]
+        cum_utility = imm_utility[level, action] + children_utility[level, action]
+        np.add.at(children_utility, (parent, flat.infoset_parent_action[level]), cum_utility)
+    tree.icfr_utility += imm_utility + children_utility
 
 # ok
 def SolveWithICFR(icfr_tree: CFRTree, iterations, perc = 10, show_perc = True, checkEveryIteration = -1, 
@@ -321,29 +300,31 @@ def SolveWithICFR(icfr_tree: CFRTree, iterations, perc = 10, show_perc = True, c
     start_time = time.time()
     last_checkpoint_time = start_time
 
-    player_count = icfr_tree.numOfPlayers
+    # Buffer the action plan of each iteration is sampled into (plans are stored by key, so it can be reused)
+    action_plan = icfr_tree.emptyActionPlan()
 
     for i in range(1, iterations + 1):
         if(show_perc and i % (iterations / 100 * perc) == 0):
             print(str(i / (iterations / 100 * perc) * perc) + "%")
-        init(icfr_tree.root, player_count)
+        init(icfr_tree)
         # Run ICFR for each player
         # to sample internal for each infomation set for each player                                                                             
-        action_plan = ICFR_sampling(icfr_tree.root) # node.id : sampled_action
-        calcReachability(icfr_tree.root, [True] * player_count)
+        action_plan.fill(-1)
+        ICFR_sampling(icfr_tree.root, action_plan) # iset.index : sampled_action
         get_utility(icfr_tree, action_plan)
         # trigger_plan = ICFR_trigger(icfr_tree.root)
-        if (CFRJointStrategy.actionPlanToString(action_plan) in icfr_tree.actionPlan.keys()):
-            icfr_tree.actionPlan[CFRJointStrategy.actionPlanToString(action_plan)][0] += 1
+        key = CFRJointStrategy.actionPlanToKey(action_plan)
+        if (key in icfr_tree.actionPlan):
+            icfr_tree.actionPlan[key][0] += 1
         else:
-            icfr_tree.actionPlan[CFRJointStrategy.actionPlanToString(action_plan)] = [1, random.random()]
+            icfr_tree.actionPlan[key] = [1, sampling.random()]
         
         # if (CFRJointStrategy.actionPlanToString(trigger_plan) in icfr_tree.triggerplan.keys()):
         #     icfr_tree.triggerplan[CFRJointStrategy.actionPlanToString(trigger_plan)] += 1
         # else:
         #     icfr_tree.triggerplan[CFRJointStrategy.actionPlanToString(trigger_plan)] = 1
         # ICFR_Observe(icfr_tree.root, action_plan)
-        ICFR_Update(icfr_tree.root)        
+        ICFR_Update(icfr_tree)
         if px < len(x_axis) and i == x_axis[px]:
             if TEST:
                 eps = getEpsilon(icfr_tree, icfr_tree.root, i)
@@ -358,7 +339,6 @@ def SolveWithICFR(icfr_tree: CFRTree, iterations, perc = 10, show_perc = True, c
             #     graph_data += [max(eps.values())]
             #     cnt += 1
                 # print(getEpsilon(icfr_tree, icfr_tree.root, i))
-            icfr_tree.root.T = i
             data = {#'epsilon': icfr_tree.checkMarginalsEpsilon(),
                     'iteration_number': i,
                     'duration': time.time() - last_checkpoint_time,
@@ -378,8 +358,8 @@ def SolveWithICFR(icfr_tree: CFRTree, iterations, perc = 10, show_perc = True, c
     ans = []
     for id in icfr_tree.information_sets:
         # print(icfr_tree.information_sets[id].nodes[0].base_node.seq, icfr_tree.information_sets[id].inRM.getStrategy().reshape(-1).tolist())
-        ans.append('{:>4s}'.format(icfr_tree.information_sets[id].nodes[0].base_node.seq) + ' ' + 
-            str([icfr_tree.information_sets[id].nodes[0].base_node.actionNames[i] for i in range(icfr_tree.information_sets[id].action_count)]) + ' ' + str(
+        ans.append('{:>4s}'.format(icfr_tree.information_sets[id].label) + ' ' + 
+            str(icfr_tree.information_sets[id].action_names) + ' ' + str(
             ['{:.2f}'.format(mu / sum(icfr_tree.information_sets[id].mu_T)) for mu in icfr_tree.information_sets[id].mu_T]))
     for i in sorted(ans):
         print(i)
@@ -0,0 +1,179 @@
+import numpy as np
+from data_structures.cfr_trees import CFRJointStrategy
+
+class ICFREpsilonEvaluator:
+    """
+    Computes the epsilons tracked by ICFR (the gain of the trigger deviations at the first information sets below the
+    root) over the flat representation of a CFRTree: for each action, the utility of the leaves below the information
+    set when the plans recommending that action are followed by the other players and the player deviates according
+    to a weighting of the plans, minus the utility of those leaves when every player follows the plans.
+    The original getEpsilon tried a few random weightings (non-negative, summing to less than 1). The deviated utility
+    is linear in the weights, so its maximum over all of them is reached by a single plan with weight 1 (or by no plan
+    at all), and the epsilon is computed exactly by trying every plan.
+    The leaves and information sets reached by each action plan stored in the tree are computed once, when the plan
+    first shows up, and kept as rows of boolean matrices, so that each evaluation is a few matrix products over
+    (plans x leaves) instead of a tree traversal per (plan, leaf) pair.
+    """
+
+    # Number of plans whose reach is computed at once when new plans are added
+    PLAN_CHUNK_SIZE = 256
+
+    def __init__(self, cfr_tree):
+        """
+        Create the evaluator for the plans sampled by ICFR on the given CFRTree.
+        """
+
+        self.cfr_tree = cfr_tree
+        self.flat_tree = cfr_tree.getFlatTree()
+        self.infoset_leaves = {}
+        self.reset()
+
+    def reset(self):
+        """
+        Forget all the plans seen so far.
+        """
+
+        flat = self.flat_tree
+        self.keys = []
+        self.plans = np.zeros((0, flat.infoset_count), dtype = np.int32)
+        # Whether each information set is reached when its player follows each plan
+        self.reached = np.zeros((0, flat.infoset_count), dtype = bool)
+        # Whether each leaf is reached when all the players follow each plan
+        self.all_reach = np.zeros((0, flat.leaf_count), dtype = bool)
+        # Whether each leaf is reached when all the players but p (respectively only p) follow each plan
+        self.others_reach = np.zeros((0, flat.numOfPlayers, flat.leaf_count), dtype = bool)
+        self.own_reach = np.zeros((0, flat.numOfPlayers, flat.leaf_count), dtype = bool)
+
+    def addPlans(self):
+        """
+        Compute the reach of the plans added to the tree since the last call.
+        """
+
+        keys = list(self.cfr_tree.actionPlan)
+        if(len(keys) < len(self.keys)):
+            # The plans of the tree have been reset
+            self.reset()
+        new_keys = keys[len(self.keys):]
+        if(len(new_keys) == 0):
+            return
+
+        flat = self.flat_tree
+        chunks = { 'plans': [self.plans], 'reached': [self.reached], 'all_reach': [self.all_reach],
+                   'others_reach': [self.others_reach], 'own_reach': [self.own_reach] }
+        for start in range(0, len(new_keys), ICFREpsilonEvaluator.PLAN_CHUNK_SIZE):
+            chunk_keys = new_keys[start:start + ICFREpsilonEvaluator.PLAN_CHUNK_SIZE]
+            plans = np.array([CFRJointStrategy.keyToActionPlan(key) for key in chunk_keys])
+            reached = flat.reachedInfosets(plans)
+            leaf_reach = flat.plansLeafReach(plans)
+
+            chunks['plans'].append(plans)
+            chunks['reached'].append(reached)
+            chunks['all_reach'].append(leaf_reach[:, -1])
+            chunks['others_reach'].append(leaf_reach[:, :-1])
+            chunks['own_reach'].append(flat.plansOwnLeafReach(plans, reached))
+
+        for (name, arrays) in chunks.items():
+            setattr(self, name, np.concatenate(arrays))
+        self.keys = keys
+
+    def infosetLeaves(self, infoset_index):
+        """
+        Returns the leaves (as indices in the leaves of the flat tree) below the given information set, together with
+        the action played there to reach each of them.
+        """
+
+        if(infoset_index in self.infoset_leaves):
+            return self.infoset_leaves[infoset_index]
+
+        flat = self.flat_tree
+        width = max(flat.max_action_count, 1)
+        player = flat.infoset_player[infoset_index]
+
+        # Walk up the sequences of the player from each leaf, until the information set is met
+        cell = flat.player_sequence[player, flat.leaves].copy()
+        leaves = []
+        actions = []
+        while(np.any(cell >= 0)):
+            hit = np.nonzero((cell >= 0) & (cell // width == infoset_index))[0]
+            leaves.append(hit)
+            actions.append(cell[hit] % width)
+            cell = np.where(cell >= 0, flat.infoset_parent_sequence[np.maximum(cell, 0) // width], -1)
+
+        res = (np.concatenate(leaves + [np.zeros(0, dtype = np.int64)]).astype(np.int64),
+               np.concatenate(actions + [np.zeros(0, dtype = np.int64)]).astype(np.int64))
+        self.infoset_leaves[infoset_index] = res
+        return res
+
+    def evaluatedNodes(self, node):
+        """
+        Returns the decision nodes whose epsilon is computed starting from the given node: the node itself, or the
+        first decision nodes below it if it is a chance node.
+        """
+
+        if(not node.isChance()):
+            return [node]
+        nodes = []
+        for child in node.children:
+            if(not child.isLeaf()):
+                nodes += self.evaluatedNodes(child)
+        return nodes
+
+    def epsilons(self, t, node = None):
+        """
+        Returns a dict with the epsilon of the information set of each node evaluated starting from the given node
+        (the root if not given), after t iterations. The weights of the plans in the deviation reaching the epsilon of
+        the last evaluated node (1 for the deviating plan, 0 for the others) are stored in the tree, as getEpsilon
+        stored the weights it tried last.
+        """
+
+        self.addPlans()
+        flat = self.flat_tree
+        tree = self.cfr_tree
+        root_children = len(tree.root.children)
+
+        counts = np.array([tree.actionPlan[key][0] for key in self.keys], dtype = float)
+        all_frequency = counts @ self.all_reach / t
+
+        epsilon = {}
+        values = {}
+        weights = None
+        for node in self.evaluatedNodes(tree.root if node is None else node):
+            iset = node.information_set
+            i = iset.index
+            p = iset.player
+
+            if(i not in values):
+                (leaves, leaf_actions) = self.infosetLeaves(i)
+                utility = flat.leaf_utility[leaves, p]
+
+                # Value of the recommended actions, on the leaves reached when all the players follow the plans
+                latter = np.bincount(leaf_actions, weights = utility * all_frequency[leaves] / root_children,
+                                     minlength = iset.action_count)
+
+                # Frequency of the plans recommending each action in the information set (when its player reaches
+                # it) and reaching each leaf below it with the other players
+                triggers = (self.plans[:, i][:, None] == np.arange(iset.action_count)[None, :]) * \
+                           (counts * self.reached[:, i])[:, None]
+                mu = triggers.T @ self.others_reach[:, p, leaves] / t
+                deviated = mu * utility / root_children
+
+                values[i] = (latter, deviated, self.own_reach[:, p, leaves].astype(float))
+
+            (latter, deviated, own_reach) = values[i]
+
+            # Deviated utility of each action when deviating to each plan, and to no plan at all (the last column)
+            gains = np.zeros((iset.action_count, len(self.keys) + 1))
+            gains[:, :-1] = deviated @ own_reach.T
+            best = np.argmax(gains, axis = 1)
+            action_eps = gains[np.arange(iset.action_count), best] - latter
+            a = int(np.argmax(action_eps))
+            epsilon[iset.id] = max(float(action_eps[a]), -1)
+
+            weights = np.zeros(len(self.keys))
+            if(best[a] < len(self.keys)):
+                weights[best[a]] = 1
+
+        if(weights is not None):
+            for (key, w) in zip(self.keys, weights.tolist()):
+                tree.actionPlan[key][1] = w
+        return epsilon
@@ -1,4 +1,4 @@
-from cfr_code.cfr import CFR
+from cfr_code.cfr import CFRIteration, pruningSchedule
 from data_structures.cfr_trees import CFRJointStrategy
 import time
 
@@ -6,9 +6,26 @@ def SolveWithReconstructionCFR(cfr_tree, iterations, perc = 10, show_perc = Fals
                                checkEveryIteration = -1, reconstructEveryIteration = 1,
                                check_callback = None, use_cfr_plus = False,
                                reconstructPlayersTogether = False,
-                               reconstructWithOptimalPlan = True):
-    
-    jointStrategy = CFRJointStrategy()
+                               reconstructWithOptimalPlan = True,
+                               alternating_updates = False,
+                               regret_pruning = False, full_pass_every_iteration = 10,
+                               bound_joint_size = False):
+    """
+    Find a NFCCE in a given extensive-form tree with the CFR-Jr algorithm, run for a given amount of iterations: every
+    reconstructEveryIteration iterations the current strategies are decomposed into a joint distribution, which is
+    added to the joint strategy.
+    If bound_joint_size is True the joint strategy is created with space for at most 2 * |A| plans, as in
+    SolveWithSampleCFR: the joint plans of each reconstruction are merged with the identical ones already stored, and
+    the least frequent plan is evicted to make room for new ones. The mass of an evicted plan is spread over the kept
+    ones by rescaling them (so the joint strategy keeps all the reconstructed mass), and the checkpoint data reports
+    it (evictions, evicted_mass, and approximation_error, the fraction of the reconstructed mass that was moved).
+    Otherwise the joint strategy is unbounded and keeps the reconstructions in factored form.
+    """
+
+    if(bound_joint_size):
+        jointStrategy = CFRJointStrategy(cfr_tree.numOfActions * 2, cfr_tree)
+    else:
+        jointStrategy = CFRJointStrategy(cfr_tree = cfr_tree)
 
     # Graph data
     graph_data = []
@@ -17,19 +34,16 @@ def SolveWithReconstructionCFR(cfr_tree, iterations, perc = 10, show_perc = Fals
     reconstruction_time = 0
     last_checkpoint_time = start_time
 
-    player_count = cfr_tree.numOfPlayers
-
     for i in range(1, iterations+1):
         if(show_perc and i % (iterations / 100 * perc) == 0):
             print(str(i / (iterations / 100 * perc) * perc) + "%")
 
         # Run CFR for each player
-        for p in range(player_count):
-            CFR(cfr_tree.root, p, [1] * player_count, use_cfr_plus)
+        (prune, strategy_weight) = pruningSchedule(i, regret_pruning, full_pass_every_iteration)
+        CFRIteration(cfr_tree, use_cfr_plus, alternating_updates, prune, strategy_weight)
             
         # Update the current strategy for each information set
-        for infoset in cfr_tree.information_sets.values():
-            infoset.updateCurrentStrategy()
+        cfr_tree.updateCurrentStrategies()
 
         # Reconstruct a joint from the marginals and add it to the current joint strategy
         if (i % reconstructEveryIteration == 0):
@@ -37,13 +51,19 @@ def SolveWithReconstructionCFR(cfr_tree, iterations, perc = 10, show_perc = Fals
             if reconstructPlayersTogether:
                 jointStrategy.addJointDistribution(cfr_tree.buildJointFromMarginals_AllPlayersTogether())
             else:
-                jointStrategy.addJointDistribution(cfr_tree.buildJointFromMarginals(select_optimal_plan = reconstructWithOptimalPlan))                
+                jointStrategy.addFactoredDistribution(cfr_tree.buildFactoredJointFromMarginals(select_optimal_plan = reconstructWithOptimalPlan))
             reconstruction_time += (time.time() - reconstruction_start_time)
 
         if(checkEveryIteration > 0 and i % checkEveryIteration == 0):
+            # Mass reconstructed so far (nothing before the first reconstruction)
+            reconstructed_mass = jointStrategy.frequencyCount
             data = {'epsilon': cfr_tree.checkEquilibrium(jointStrategy),
                     'marginal_epsilon': cfr_tree.checkMarginalsEpsilon(),
-                    'joint_support_size': len(jointStrategy.plans),
+                    'joint_support_size': jointStrategy.supportSize(),
+                    'evictions': jointStrategy.evictions,
+                    'evicted_mass': jointStrategy.evicted_mass,
+                    'approximation_error': (jointStrategy.evicted_mass / reconstructed_mass
+                                            if reconstructed_mass > 0 else 0),
                     'iteration_number': i,
                     'duration': time.time() - last_checkpoint_time,
                     'reconstruction_time': reconstruction_time,
@@ -1,21 +1,24 @@
 from data_structures.cfr_trees import CFRJointStrategy
+from cfr_code.batched_sample_cfr import BatchedSampleCFR
 from functools import reduce
 import time
 
-def sampleCFR(node, player, pi, action_plan):
+def sampleCFR(node, player, pi, action_plan, rows):
     """
     SCFR algorithm.
     node = the current node the algorithm is in.
     player = the player for which the algorithm is being run.
     pi = a probability vector containing, for each player, the probability to reach the current node.
     action_plan = the sampled action plan.
+    rows = the (cumulative_regret, cumulative_strategy, current_strategy) lists of each information set, by table row
+    (see InfosetTable.rowLists).
     """
 
     n_players = len(pi)
     node.visits += reduce(lambda x, y: x * y, pi, 1)
     
     if(node.isChance()):
-        return sampleCFR(node.children[node.sampleAction()], player, pi, action_plan)
+        return sampleCFR(node.children[node.sampleAction()], player, pi, action_plan, rows)
     
     if(node.isLeaf()):
         return node.utility[player]        
@@ -24,23 +27,24 @@ def sampleCFR(node, player, pi, action_plan):
     v = 0
     v_alt = [0 for a in node.children]
     
-    sampled_action = action_plan[iset.id]
+    sampled_action = action_plan[iset.index]
     
     if(max(pi) == 0):
-        return sampleCFR(node.children[sampled_action], player, pi, action_plan)
+        return sampleCFR(node.children[sampled_action], player, pi, action_plan, rows)
     
     for a in range(len(node.children)):
         if(a == sampled_action):
-            v_alt[a] = sampleCFR(node.children[a], player, pi, action_plan)
+            v_alt[a] = sampleCFR(node.children[a], player, pi, action_plan, rows)
         else:
             old_pi = pi[iset.player]
             pi[iset.player] = 0
-            v_alt[a] = sampleCFR(node.children[a], player, pi, action_plan)
+            v_alt[a] = sampleCFR(node.children[a], player, pi, action_plan, rows)
             pi[iset.player] = old_pi
         
     v = v_alt[sampled_action]
     
     if(iset.player == player):
+        (regret, cumulative_strategy, strategy) = rows[iset.table_row]
         pi_other = 1
         for i in range(len(pi)):
             if(i != player):
@@ -48,28 +52,36 @@ def sampleCFR(node, player, pi, action_plan):
 
         for a in range(len(node.children)):
             ##### CFR+ #####
-            iset.cumulative_regret[a] = max(iset.cumulative_regret[a] + pi_other * (v_alt[a] - v), 0)
+            regret[a] = max(regret[a] + pi_other * (v_alt[a] - v), 0)
             
             ##### This is useless for NFCCE #####
-            iset.cumulative_strategy[a] += pi[player] * iset.current_strategy[a]
+            cumulative_strategy[a] += pi[player] * strategy[a]
     
     return v
 
 def SolveWithSampleCFR(cfr_tree, iterations, perc = 10, show_perc = False, checkEveryIteration = -1,
-                       bootstrap_iterations = 0, bound_joint_size = True, check_callback = None):
+                       bootstrap_iterations = 0, bound_joint_size = True, check_callback = None, batch_size = 1):
     """
     Find a NFCCE in a given extensive-form tree with the SCFR algorithm, run for a given amount of iterations.
     If show_perc is True, every perc% of the target iterations are done a message is shown on the console.
     checkEveryIteration is the frequency to collect convergence data, such as the epsilon or the elapsed time.
-    If bound_joint_size is True the joint strategy is created with space for at most 2 * |A| plans, otherwise it is
-    created with an unbounded space.
+    If bound_joint_size is True the joint strategy is created with space for at most 2 * |A| plans (the least frequent
+    one is evicted to make room for new ones and its mass is spread over the kept ones, see the evictions and
+    evicted_mass checkpoint data), otherwise it is created with an unbounded space.
+    If batch_size is greater than 1, each iteration samples batch_size action plans and runs their traversals at once
+    with BatchedSampleCFR (regret updates are averaged over the batch); each plan enters the joint strategy with
+    weight 1 / batch_size.
     """
 
     if(bound_joint_size):
-        jointStrategy = CFRJointStrategy(cfr_tree.numOfActions * 2)
+        jointStrategy = CFRJointStrategy(cfr_tree.numOfActions * 2, cfr_tree)
     else:
-        jointStrategy = CFRJointStrategy(-1)
+        jointStrategy = CFRJointStrategy(-1, cfr_tree)
     player_count = cfr_tree.numOfPlayers
+    # Reduced plans of the action plans sampled so far, as the same plans are sampled again and again
+    reduction_memo = {}
+
+    engine = BatchedSampleCFR(cfr_tree, batch_size) if batch_size > 1 else None
     
     # Graph data
     graph_data = []
@@ -83,21 +95,31 @@ def SolveWithSampleCFR(cfr_tree, iterations, perc = 10, show_perc = False, check
         if((t+1) > 0 and show_perc and (t+1) % (iterations / 100 * perc) == 0):
             print(str((t+1) / (iterations / 100 * perc) * perc) + "%")
             
-        # Sample a joint action plan from the current strategies
-        action_plan = cfr_tree.sampleActionPlan()
+        if(engine != None):
+            # Sample a batch of joint action plans and run CFR for each of them and each player
+            action_plans = engine.iteration()
+        else:
+            # Sample a joint action plan from the current strategies
+            action_plan = cfr_tree.sampleActionPlan()
             
-        # Run CFR for each player
-        for p in range(player_count):
-            sampleCFR(cfr_tree.root, p, [1] * player_count, action_plan)
+            # Run CFR for each player, on Python lists copied from the InfosetTable (see CFRIteration)
+            rows = cfr_tree.infoset_table.rowLists()
+            plan = action_plan.tolist()
+            for p in range(player_count):
+                sampleCFR(cfr_tree.root, p, [1] * player_count, plan, rows)
+            cfr_tree.infoset_table.storeRowLists(rows)
             
         # Update the current strategy for each information set
-        for infoset in cfr_tree.information_sets.values():
-            infoset.updateCurrentStrategy()
+        cfr_tree.updateCurrentStrategies()
             
         if(i <= bootstrap_iterations):
             continue # Neither update the joint, nor check the equilibrium
 
-        jointStrategy.addActionPlan(CFRJointStrategy.reduceActionPlan(action_plan, cfr_tree))
+        if(engine != None):
+            for reduced_plan in cfr_tree.getFlatTree().reducePlans(action_plans):
+                jointStrategy.addActionPlan(reduced_plan, 1 / batch_size)
+        else:
+            jointStrategy.addActionPlan(CFRJointStrategy.reduceActionPlan(action_plan, cfr_tree, reduction_memo))
         
         if(checkEveryIteration > 0 and t % checkEveryIteration == 0):
             data = {'epsilon': cfr_tree.checkEquilibrium(jointStrategy),
@@ -105,6 +127,8 @@ def SolveWithSampleCFR(cfr_tree, iterations, perc = 10, show_perc = False, check
                     'joint_support_size': len(jointStrategy.plans),
                     'relative_joint_size': jointStrategy.frequencyCount / t,
                     'max_plan_frequency': max(jointStrategy.plans.values()),
+                    'evictions': jointStrategy.evictions,
+                    'evicted_mass': jointStrategy.evicted_mass,
                     'iteration_number': t,
                     'duration': time.time() - last_checkpoint_time,
                     'utility': cfr_tree.getUtility(jointStrategy)}
@@ -115,5 +139,7 @@ def SolveWithSampleCFR(cfr_tree, iterations, perc = 10, show_perc = False, check
 
             last_checkpoint_time = time.time()
         
+    if(engine != None):
+        engine.writeBack()
     return {'utility': cfr_tree.getUtility(jointStrategy), 'joint': jointStrategy, 'graph_data': graph_data,
             'tot_time': time.time() - start_time}
\ No newline at end of file
@@ -0,0 +1,125 @@
+import numpy as np
+
+class VectorizedCFR:
+    """
+    Vanilla CFR (or CFR+) run over the flat representation of a CFRTree.
+    Each iteration is made of two batched passes over the depth-ordered nodes: reach probabilities top-down and
+    counterfactual values bottom-up. Regrets and strategies of all the players are then updated at once, by scattering
+    the contributions of every node into the InfosetTable of the tree.
+    With CFR+ the cumulative regrets are clamped after the contribution of each node, in the order in which the
+    recursive engine (CFRAllPlayers) visits the nodes of each information set, so that both engines agree.
+    """
+
+    def __init__(self, cfr_tree, use_cfr_plus = False):
+        """
+        Create the engine for the given CFRTree, starting from the regrets and strategies currently stored in its
+        InfosetTable.
+        """
+
+        self.cfr_tree = cfr_tree
+        self.flat_tree = cfr_tree.getFlatTree()
+        self.infoset_table = cfr_tree.infoset_table
+        self.use_cfr_plus = use_cfr_plus
+
+        flat = self.flat_tree
+        self.visits = np.array([n.visits for n in flat.nodes], dtype = float)
+
+        # Static data about the decision edges, i.e. (node, action) pairs
+        e = flat.decision_edges
+        self.edge_parent = flat.parent[e]
+        self.edge_player = flat.edge_player[e]
+        self.edge_cell = flat.edge_infoset[e] * flat.max_action_count + flat.incoming_action[e]
+        self.cell_count = flat.infoset_count * flat.max_action_count
+
+        if(use_cfr_plus):
+            # Rank of the parent of each edge among the nodes of its information set, in visiting order: the k-th
+            # round of updates holds the edges of the k-th visited node of each information set
+            order = self.depthFirstOrder()
+            nodes = np.unique(self.edge_parent)
+            nodes = nodes[np.lexsort((order[nodes], flat.infoset[nodes]))]
+            infosets = flat.infoset[nodes]
+            first = np.searchsorted(infosets, infosets)
+            node_rank = np.zeros(flat.node_count, dtype = np.int64)
+            node_rank[nodes] = np.arange(len(nodes)) - first
+            edge_rank = node_rank[self.edge_parent]
+            self.clamp_rounds = []
+            for k in range(int(edge_rank.max()) + 1):
+                edges = np.nonzero(edge_rank == k)[0]
+                self.clamp_rounds.append((edges, flat.edge_infoset[e[edges]], flat.incoming_action[e[edges]]))
+
+    def depthFirstOrder(self):
+        """
+        Returns the position of each node in a depth-first (pre-order) visit of the tree, children in action order.
+        """
+
+        flat = self.flat_tree
+
+        # Size of the subtree below each node
+        size = np.ones(flat.node_count, dtype = np.int64)
+        for d in range(flat.max_depth, 0, -1):
+            lo, hi = flat.levelRange(d)
+            np.add.at(size, flat.parent[lo:hi], size[lo:hi])
+
+        # Each node comes after its parent and the subtrees of its previous siblings
+        order = np.zeros(flat.node_count, dtype = np.int64)
+        for d in range(1, flat.max_depth + 1):
+            lo, hi = flat.levelRange(d)
+            preceding = np.cumsum(size[lo:hi]) - size[lo:hi]
+            first_sibling = flat.child_offset[flat.parent[lo:hi]] - lo
+            order[lo:hi] = order[flat.parent[lo:hi]] + 1 + preceding - preceding[first_sibling]
+        return order
+
+    def counterfactualReach(self, reach):
+        """
+        Given the (players + 1, nodes) reach matrix, returns a (players, nodes) matrix holding for each player the
+        product of the reach probabilities of all the other players (chance excluded).
+        """
+
+        n_players = self.flat_tree.numOfPlayers
+        cf_reach = np.ones((n_players, reach.shape[1]))
+        for p in range(n_players):
+            for q in range(n_players):
+                if(q != p):
+                    cf_reach[p] *= reach[q]
+        return cf_reach
+
+    def iteration(self):
+        """
+        Run one CFR iteration for all the players, updating cumulative regrets and strategies (but not the current
+        strategy).
+        """
+
+        flat = self.flat_tree
+        n_players = flat.numOfPlayers
+        e = flat.decision_edges
+        table = self.infoset_table
+
+        probabilities = flat.edgeProbabilities(table.current_strategy)
+        reach = flat.reachProbabilities(probabilities)
+        values = flat.expectedValues(probabilities)
+        cf_reach = self.counterfactualReach(reach)
+
+        self.visits += n_players * np.prod(reach[:n_players], axis = 0)
+
+        regret = cf_reach[self.edge_player, self.edge_parent] * \
+                 (values[self.edge_player, e] - values[self.edge_player, self.edge_parent])
+        strategy = reach[self.edge_player, self.edge_parent] * probabilities[e]
+
+        shape = table.cumulative_regret.shape
+        if(self.use_cfr_plus):
+            for (edges, infosets, actions) in self.clamp_rounds:
+                cumulative = table.cumulative_regret[infosets, actions] + regret[edges]
+                table.cumulative_regret[infosets, actions] = np.maximum(cumulative, 0)
+        else:
+            table.cumulative_regret += np.bincount(self.edge_cell, weights = regret,
+                                                   minlength = self.cell_count).reshape(shape)
+        table.cumulative_strategy += np.bincount(self.edge_cell, weights = strategy,
+                                                 minlength = self.cell_count).reshape(shape)
+
+    def writeBack(self):
+        """
+        Copy the visits back into the nodes of the CFRTree (regrets and strategies already live in its InfosetTable).
+        """
+
+        for (node, visits) in zip(self.flat_tree.nodes, self.visits.tolist()):
+            node.visits = visits
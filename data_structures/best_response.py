@@ -0,0 +1,88 @@
+import numpy as np
+
+class BestResponseEvaluator:
+    """
+    Computes the best-response values of all the players over the flat representation of a CFRTree.
+    For each player, the information sets are visited bottom-up in a precomputed order (by decreasing length of their
+    sequence), so that the value V of each information set is computed once per evaluation and then added to the
+    (infoset, action) cell of its parent sequence.
+    """
+
+    def __init__(self, flat_tree):
+        """
+        Precompute the visiting order of the information sets of each player of the given FlatCFRTree.
+        """
+
+        self.flat_tree = flat_tree
+        flat = flat_tree
+
+        self.cell_count = flat.infoset_count * flat.max_action_count
+
+        # For each player, the cell of the parent sequence of each leaf (the empty sequence is mapped to the
+        # extra cell with index cell_count)
+        self.leaf_sequence = []
+        # For each player, a list of levels (from the deepest one), each holding the indices of the infosets at that
+        # level and the cells of their parent sequences
+        self.levels = []
+
+        for p in range(flat.numOfPlayers):
+            leaf_sequence = flat.player_sequence[p, flat.leaves].copy()
+            leaf_sequence[leaf_sequence < 0] = self.cell_count
+            self.leaf_sequence.append(leaf_sequence)
+
+            p_infosets = np.nonzero(flat.infoset_player == p)[0]
+            lengths = flat.infoset_sequence_length[p_infosets]
+            levels = []
+            for length in sorted(set(lengths.tolist()), reverse = True):
+                infosets = p_infosets[lengths == length]
+                parents = flat.infoset_parent_sequence[infosets].copy()
+                parents[parents < 0] = self.cell_count
+                levels.append((infosets, parents))
+            self.levels.append(levels)
+
+    def bestResponseValue(self, player, marginalized_utility):
+        """
+        Returns the value of a best response of the given player, given the marginalized utility of each leaf
+        (i.e. its utility for the player, weighted by the probability that chance and the other players reach it).
+        """
+
+        flat = self.flat_tree
+
+        cell_values = np.bincount(self.leaf_sequence[player], weights = marginalized_utility,
+                                  minlength = self.cell_count + 1)
+        values = cell_values[:self.cell_count].reshape(flat.infoset_count, flat.max_action_count)
+
+        for (infosets, parents) in self.levels[player]:
+            V = np.where(flat.action_mask[infosets], values[infosets], -np.inf).max(axis = 1)
+            np.add.at(cell_values, parents, V)
+
+        return cell_values[self.cell_count]
+
+    def bestResponseValues(self, reach):
+        """
+        Returns the best-response value of each player, given the (players + 1, nodes) reach matrix (as returned by
+        FlatCFRTree.reachProbabilities) of the strategies the other players are playing.
+        """
+
+        flat = self.flat_tree
+        leaf_reach = reach[:, flat.leaves]
+
+        values = []
+        for p in range(flat.numOfPlayers):
+            others_reach = np.prod(np.delete(leaf_reach, p, axis = 0), axis = 0)
+            values.append(self.bestResponseValue(p, others_reach * flat.leaf_utility[:, p]))
+        return values
+
+    def epsilons(self, strategies):
+        """
+        Returns, for each player, the difference between its expected utility and its best-response value when all
+        the players follow the given padded matrix of behavioural strategies.
+        """
+
+        flat = self.flat_tree
+        probabilities = flat.edgeProbabilities(strategies)
+        reach = flat.reachProbabilities(probabilities)
+        utility = (np.prod(reach[:, flat.leaves], axis = 0)[:, None] * flat.leaf_utility).sum(axis = 0)
+        best_responses = self.bestResponseValues(reach)
+
+        return [utility[p] - best_responses[p] for p in range(flat.numOfPlayers)]
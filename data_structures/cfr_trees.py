@@ -1,13 +1,23 @@
 from functools import reduce
 from cfr_code.cfr import CFR
 from data_structures.trees import Tree, Node, Leaf, randomTree
-from data_structures.regret_minimizers import InternalRM, ExternalRM
+from data_structures.regret_minimizers import RegretMinimizerBank
+from data_structures.flat_trees import FlatCFRTree
+from data_structures.infoset_tables import InfosetTable
+from data_structures.best_response import BestResponseEvaluator
+from data_structures.supporting_plans import SupportingPlanSearch
+from data_structures.indexed_heaps import IndexedMinHeap
+from data_structures import sampling
+import itertools
 import random
 import math
 import re
 import time
 import numpy as np
 
+# Action plans are arrays holding the action of each information set (by dense index), -1 for the missing ones
+ACTION_PLAN_DTYPE = np.int32
+
 class CFRTree:
     """
     Wrapper around an extensive-form tree for holding additional CFR-related code and data.
@@ -22,84 +32,204 @@ class CFRTree:
         self.information_sets = {}
         self.numOfActions = 0
         self.numOfPlayers = base_tree.numOfPlayers
+        self.flat_tree = None
+        self.best_response_evaluator = None
+        self.supporting_plan_search = None
+        self.regret_minimizer_bank = None
+        self.V_epoch = 0 # Incremented whenever the marginalized utilities change, to invalidate CFRInformationSet.cached_V
 # icfr
-        self.actionPlan = {}
+        self.actionPlan = {} # ICFR: key of each sampled action plan -> [count, weight]
+        self.icfr_epoch = 0 # ICFR: number of the current iteration (see CFRInformationSet.epoch)
+        self.icfr_utility = None # ICFR: (infosets, max_action_count) buffers of the utilities of the information sets
+        self.icfr_imm_utility = None
+        self.icfr_epsilon_evaluator = None
         # self.triggerplan = {}
 
+        # Sequences are hash-consed into ids, propagated down the tree: id 0 is the empty sequence, and each other id
+        # stands for the sequence of an information set extended with one of its actions. With perfect recall all the
+        # nodes of an information set have the same sequence, so the ids of its extensions are allocated once, when it
+        # is created (sequence_start of the information set + action)
+        sequence_extensions = [None] # id -> (parent id, information set id, action)
+        sequence_start = {}
+        # Children information sets and leaves of each sequence
+        sequence_infosets = [[]]
+        sequence_leaves = [[]]
+
+        def toDict(sequence_id):
+            sequence = []
+            while(sequence_id != 0):
+                (sequence_id, iset_id, action) = sequence_extensions[sequence_id]
+                sequence.append((iset_id, action))
+            return dict(reversed(sequence))
+
         nodes_to_expand = [ self.root ]
+        sequences_to_expand = [ (0,) * self.numOfPlayers ]
 
         while(len(nodes_to_expand) > 0):
             node = nodes_to_expand.pop()
+            sequences = sequences_to_expand.pop()
 
             if(node.isChance()):
                 for child in node.children:
                     nodes_to_expand.append(child)
+                    sequences_to_expand.append(sequences)
                 continue
 
             iset_id = node.base_node.information_set
             if(iset_id < 0):
                 # This is a leaf (or an error has occurred)
+                for sequence_id in sequences:
+                    if(sequence_id != 0):
+                        sequence_leaves[sequence_id].append(node)
                 continue
 
-            for child in node.children:
-                nodes_to_expand.append(child)
-                self.numOfActions += 1
+            sequence_id = sequences[node.player]
 
             if(iset_id in self.information_sets):
-                node.information_set = self.information_sets[iset_id]
-                node.information_set.addNode(node)
+                iset = self.information_sets[iset_id]
+                if(sequence_extensions[sequence_start[iset]][0] != sequence_id):
+                    iset.addNode(node)
+                    print("Sequences = ")
+                    for n in iset.nodes:
+                        print(n.base_node.getSequence(iset.player))
+                    raise Exception("ERROR: This tree is not a game with perfect recall. Nodes of information set "
+                                    + str(iset.id) + " (" + reduce(lambda acc, el: str(el.base_node.id) + ', ' + acc, iset.nodes, "") + \
+                                    ") have different sequences.")
+                node.information_set = iset
+                iset.addNode(node)
             else:
-                iset = CFRInformationSet(iset_id, node.player, len(node.children), node.base_node.getSequence(node.player), self)
+                iset = CFRInformationSet(iset_id, node.player, len(node.children), toDict(sequence_id), self)
+                iset.index = len(self.information_sets)
+                # Only the kuhn builder labels nodes with a seq string
+                iset.label = getattr(node.base_node, 'seq', iset.label)
+                iset.action_names = node.base_node.actionNames
                 iset.addNode(node)
                 self.information_sets[iset_id] = iset
                 node.information_set = iset
 
+                sequence_start[iset] = len(sequence_extensions)
+                for a in range(iset.action_count):
+                    sequence_extensions.append((sequence_id, iset_id, a))
+                    sequence_infosets.append([])
+                    sequence_leaves.append([])
+                if(sequence_id != 0):
+                    sequence_infosets[sequence_id].append(iset)
+
+            start = sequence_start[iset]
+            player = node.player
+            for (a, child) in enumerate(node.children):
+                nodes_to_expand.append(child)
+                sequences_to_expand.append(sequences[:player] + (start + a,) + sequences[player + 1:])
+                self.numOfActions += 1
+
+        # Setup children leaves and children infosets for each information set
+        for iset in self.information_sets.values():
+            start = sequence_start[iset]
+            iset.children_infoset = sequence_infosets[start:start + iset.action_count]
+            iset.children_leaves = sequence_leaves[start:start + iset.action_count]
+
+        self.infoset_table = InfosetTable(sorted(self.information_sets.values(), key = lambda i: i.index))
+
         self.infosets_by_player = []
         for p in range(self.numOfPlayers):
             p_isets = list(filter(lambda i: i.player == p, self.information_sets.values()))
             self.infosets_by_player.append(p_isets)
 
-        for iset in self.information_sets.values():
-            seq = iset.sequence
+    def dropBaseTree(self):
+        """
+        Detach the nodes of this tree from the nodes of the base Tree it was built from, so that the base Tree can be
+        freed once it is not referenced anymore. Nothing but drawing (utilities.drawing) needs the base nodes after the
+        tree has been built.
+        """
 
-            for n in iset.nodes:
-                if(n.base_node.getSequence(iset.player) != seq):
-                    print("Sequences = ")
-                    for node in iset.nodes:
-                        print(node.base_node.getSequence(iset.player))
-                    raise Exception("ERROR: This tree is not a game with perfect recall. Nodes of information set "
-                                    + str(iset.id) + " (" + reduce(lambda acc, el: str(el.base_node.id) + ', ' + acc, iset.nodes, "") + \
-                                    ") have different sequences.")
+        nodes = [ self.root ]
+        while(len(nodes) > 0):
+            node = nodes.pop()
+            node.base_node = None
+            nodes.extend(node.children)
 
-            # Setup children leaves and children infosets for this information set
-            iset.children_infoset = []
-            iset.children_leaves = []
-            for a in range(iset.action_count):
-                iset.children_infoset.append(list(iset.getChildrenInformationSets(a)))
-                iset.children_leaves.append(list(iset.getChildrenLeaves(a)))
-                # print(iset.children_leaves)
+    def getFlatTree(self):
+        """
+        Get the flat (array-backed) representation of this tree, building it the first time it is requested.
+        """
+
+        if(self.flat_tree == None):
+            self.flat_tree = FlatCFRTree(self)
+        return self.flat_tree
+
+    def getBestResponseEvaluator(self):
+        """
+        Get the best-response evaluator over the flat representation of this tree, building it the first time it is
+        requested.
+        """
+
+        if(self.best_response_evaluator == None):
+            self.best_response_evaluator = BestResponseEvaluator(self.getFlatTree())
+        return self.best_response_evaluator
+
+    def getSupportingPlanSearch(self):
+        """
+        Get the supporting-plan search over the flat representation of this tree, building it the first time it is
+        requested.
+        """
+
+        if(self.supporting_plan_search == None):
+            self.supporting_plan_search = SupportingPlanSearch(self.getFlatTree())
+        return self.supporting_plan_search
+
+    def getRegretMinimizerBank(self):
+        """
+        Get the bank holding the ICFR regret minimizers of the information sets of this tree, building it the first
+        time it is requested.
+        """
+
+        if(self.regret_minimizer_bank == None):
+            self.regret_minimizer_bank = RegretMinimizerBank(self.infoset_table.action_count)
+        return self.regret_minimizer_bank
+
+    def updateCurrentStrategies(self):
+        """
+        Recalculate the current strategy of every information set based on its cumulative regret.
+        """
+
+        self.infoset_table.updateCurrentStrategies()
+
+    def emptyActionPlan(self):
+        """
+        Get an action plan for this tree with no action set in any information set.
+        """
+
+        return np.full(len(self.information_sets), -1, dtype = ACTION_PLAN_DTYPE)
 
     def sampleActionPlan(self):
         """
         Sample a joint action plan from the tree (one action per each information set).
         """
 
-        actionPlan = {}
-        for id in self.information_sets:
-            actionPlan[id] = self.information_sets[id].sampleAction()
-        return actionPlan
+        table = self.infoset_table
+        return sampling.sampleRowsFromCDFs(table.strategy_cdf, 1, table.last_action)[0].astype(ACTION_PLAN_DTYPE)
 
     def getUtility(self, joint):
         """
         Get the utility obtained by the players when playing a given joint strategy over this tree.
         """
 
+        if(joint.frequencyCount == 0):
+            # Nothing has been added to the joint strategy yet
+            return [0] * self.numOfPlayers
+
+        if(joint.cfr_tree == self):
+            leaf_weights = joint.getLeafWeights()
+            flat = self.getFlatTree()
+            return list(leaf_weights[self.numOfPlayers] @ flat.leaf_utility / joint.frequencyCount)
+
         utility = [0] * self.numOfPlayers
 
-        for actionPlanString in joint.plans:
+        plans = joint.expandedPlans()
+        for actionPlanKey in plans:
             # ?
-            actionPlan = CFRJointStrategy.stringToActionPlan(actionPlanString)
-            frequency = joint.plans[actionPlanString] / joint.frequencyCount
+            actionPlan = CFRJointStrategy.keyToActionPlan(actionPlanKey)
+            frequency = plans[actionPlanKey] / joint.frequencyCount
 
             leafUtility = self.root.utilityFromActionPlan(actionPlan, default = [0] * self.numOfPlayers)
             for i in range(len(utility)):
@@ -111,11 +241,26 @@ class CFRTree:
 
         epsilons = self.getUtility(joint)
 
+        if(joint.frequencyCount == 0):
+            # An empty joint strategy has zero utility, and so does any best response to it
+            return epsilons
+
+        if(joint.cfr_tree == self):
+            # One best-response pass per player over the aggregated leaf weights
+            leaf_weights = joint.getLeafWeights() / joint.frequencyCount
+            flat = self.getFlatTree()
+            evaluator = self.getBestResponseEvaluator()
+            for p in range(self.numOfPlayers):
+                epsilons[p] -= evaluator.bestResponseValue(p, leaf_weights[p] * flat.leaf_utility[:, p])
+            return epsilons
+
+        plans = joint.expandedPlans()
         for p in range(self.numOfPlayers):
             self.root.clearMarginalizedUtility()
+            self.V_epoch += 1
 
-            for (actionPlanString, frequency) in joint.plans.items():
-                self.root.marginalizePlayer(CFRJointStrategy.stringToActionPlan(actionPlanString),
+            for (actionPlanKey, frequency) in plans.items():
+                self.root.marginalizePlayer(CFRJointStrategy.keyToActionPlan(actionPlanKey),
                                             frequency / joint.frequencyCount, p)
 
             root_infosets = list(filter(lambda i: i.sequence == {}, self.infosets_by_player[p]))
@@ -125,89 +270,51 @@ class CFRTree:
         return epsilons
 # ? 
     def checkMarginalsEpsilon(self):
+        """
+        Get, for each player, the difference between the expected utility under the current average behavioural
+        strategies and the value of a best response to them.
+        """
 
-        epsilons = self.root.getExpectedUtility()
-
-        for p in range(self.numOfPlayers):
-            self.root.clearMarginalizedUtility()
-            self.root.marginalizePlayerFromBehaviourals(1, p)
-
-            root_infosets = list(filter(lambda i: i.sequence == {}, self.infosets_by_player[p]))
+        strategies = self.getFlatTree().gatherStrategies(lambda i: i.getAverageStrategy())
+        return self.getBestResponseEvaluator().epsilons(strategies)
 
-            epsilons[p] -= sum(map(lambda i: i.V(), root_infosets))
+    def buildJointFromMarginals(self, select_optimal_plan = True):
+        """
+        Decompose the current strategies of the players into a joint distribution over (reduced) joint action plans,
+        returned as a list of (plan, probability) pairs: the cross product of the per-player distributions of
+        buildFactoredJointFromMarginals.
+        """
 
-        return epsilons
+        return list(CFRJointStrategy.productPlans(self.buildFactoredJointFromMarginals(select_optimal_plan)))
 
-    def buildJointFromMarginals(self, select_optimal_plan = True):
+    def buildFactoredJointFromMarginals(self, select_optimal_plan = True):
+        """
+        Decompose the current strategy of each player into a distribution over its (reduced) action plans, returned
+        as a list with a (plans, weights) pair for each player: a (K, infosets) matrix of plans, setting only the
+        information sets of the player, and the K weights. The joint distribution is their product.
+        """
 
         leaves = set()
         self.root.find_terminals(leaves)
 
+        # Leaves are tried in the iteration order of the set, as the leaf-by-leaf search did (it breaks the ties)
+        flat = self.getFlatTree()
+        leaf_order = flat.leaf_index[[flat.node_index[l] for l in leaves]].astype(np.int64)
+        search = self.getSupportingPlanSearch()
+        strategies = self.infoset_table.current_strategy
+
         all_players_plan_distributions = []
 
         for p in range(self.numOfPlayers):
-            self.root.buildRealizationForm(p, 1)
-            player_plan_distribution = []
-
-            nonZeroLeaf = True
-            while nonZeroLeaf:
-                # for l in leaves:
-                #     print((l.id, l.base_node.getSequence(p), l.omega))
-
-                best_plan = None
-                best_plan_value = 0
-                best_plan_leaf = None
-
-                for l in leaves:
-                    if l.omega == 0:
-                        continue
-
-                    (plan, val) = self.builSupportingPlan(l, p)
-                    if val > best_plan_value:
-                        best_plan = plan
-                        best_plan_value = val
-                        best_plan_leaf = l
-
-                        if not select_optimal_plan:
-                            break
-
-                if best_plan == None:
-                    for l in leaves:
-                        print((l.id, l.base_node.getSequence(p), l.omega))
-                    raise Exception("ERROR")
-
-                for t in self.root.terminalsUnderPlan(p, best_plan):
-                    t.omega -= best_plan_value
-
-                nonZeroLeaf = False
-                for l in leaves:
-                    if l.omega > 0.001:
-                        nonZeroLeaf = True
-                        break
-
-                player_plan_distribution.append((best_plan, best_plan_value))
-
-            all_players_plan_distributions.append(player_plan_distribution)
-
-        # Merge plans of all players into a single joint distribution (cross product)
-        joint_distribution = all_players_plan_distributions[0]
-
-        for p in range(1, self.numOfPlayers):
-            new_joint_distribution = []
-            for j in joint_distribution:
-                for d in all_players_plan_distributions[p]:
-                    joint_plan = {**j[0], **d[0]}
-                    joint_probability = j[1] * d[1]
-                    new_joint_distribution.append((joint_plan, joint_probability))
-            joint_distribution = new_joint_distribution
+            player_plan_distribution = search.decompose(p, strategies, leaf_order, select_optimal_plan)
 
-        reduced_joint_distribution = []
+            # The reduction of a plan only depends on the actions of its own player, so each player can be reduced
+            # on its own
+            plans = np.array([plan for (plan, _) in player_plan_distribution], dtype = ACTION_PLAN_DTYPE)
+            weights = np.array([weight for (_, weight) in player_plan_distribution], dtype = float)
+            all_players_plan_distributions.append((flat.reducePlans(plans), weights))
 
-        for (joint_plan, joint_probability) in joint_distribution:
-            reduced_joint_plan = CFRJointStrategy.reduceActionPlan(joint_plan, self)
-            reduced_joint_distribution.append((reduced_joint_plan, joint_probability))
-
-        return reduced_joint_distribution
+        return all_players_plan_distributions
 
     def buildJointFromMarginals_AllPlayersTogether(self):
 
@@ -235,9 +342,9 @@ class CFRTree:
                     best_plan_value = val
                     best_plan_leaf = l
 
-            if best_plan == None:
+            if best_plan is None:
                 for l in leaves:
-                    print((l.id, l.base_node.getSequence(None), l.omega))
+                    print((l.id, l.getSequence(None), l.omega))
                 raise Exception("ERROR")
 
             for t in self.root.terminalsUnderPlan(None, best_plan):
@@ -264,16 +371,18 @@ class CFRTree:
         for iset in player_infosets:
             iset.supportingPlanInfo = None   
 
-        plan = leaf.base_node.getSequence(targetPlayer)
+        plan = self.emptyActionPlan()
         weight = leaf.omega
 
-        for (iset_id, action) in plan.items():
-            self.information_sets[iset_id].supportingPlanInfo = (action, leaf.omega)
+        for (iset_id, action) in leaf.getSequence(targetPlayer).items():
+            iset = self.information_sets[iset_id]
+            iset.supportingPlanInfo = (action, leaf.omega)
+            plan[iset.index] = action
 
         for iset in player_infosets:
             iset.updateSupportingPlan(targetPlayer)
             (a, w) = iset.supportingPlanInfo
-            plan[iset.id] = a
+            plan[iset.index] = a
             weight = min(weight, w)
 
         weight = min(self.root.terminalsUnderPlan(targetPlayer, plan), key = lambda t: t.omega).omega
@@ -283,40 +392,67 @@ class CFRTree:
 class CFRNode:
     """
     Wrapper around an extensive-form node for holding additional CFR-related code and data.
+    Nodes are kept small with __slots__: omega and marginalized_utility only exist once the code using them sets them,
+    and base_node is None once the tree has been detached from its base Tree (see CFRTree.dropBaseTree).
     """
 
+    __slots__ = ('id', 'parent', 'player', 'children', 'incoming_action', 'visits', 'base_node', 'is_leaf', 'utility',
+                 'information_set', 'omega', 'marginalized_utility')
+
     def __init__(self, base_node, parent = None):
         """
         Create a CFRNode starting from a base Node.
-        It recursively creates also all the CFRNodes from the children of the base Node, up to the leaves.
+        If no parent is given, it also creates all the CFRNodes of the subtree of the base Node, up to the leaves
+        (iteratively, so that deep trees do not hit the recursion limit).
         """
 
         self.id = base_node.id
         self.parent = parent
         self.player = base_node.player
-        self.children = []
+        self.is_leaf = len(base_node.children) == 0
+        # Leaves share an empty tuple instead of holding an empty list each
+        self.children = () if self.is_leaf else []
         self.incoming_action = base_node.incoming_action
-        # self.reachability = -1
-        for child in base_node.children:
-            n = CFRChanceNode(child, self) if child.isChance() else CFRNode(child, self)
-            self.children.append(n)
-# icfr tag
-        # self.inRM = InternalRM()
-        # self.exRM = {}
-        # self.externalsigma = ""
-        self.T = 0
 
         self.visits = 0
         self.base_node = base_node
 
-        self.is_leaf = len(self.children) == 0
-        self.utility = [0] * 3
-        if(self.isLeaf()):
-            self.utility = base_node.utility
+        # Only leaves have a utility
+        self.utility = base_node.utility if self.is_leaf else None
+
+        if(parent == None):
+            self.buildSubtree()
+
+    def buildSubtree(self):
+        """
+        Create the CFRNodes of the subtree of the base Node of this node, with an explicit stack.
+        """
+
+        nodes_to_expand = [ self ]
+        while(len(nodes_to_expand) > 0):
+            node = nodes_to_expand.pop()
+            for child in node.base_node.children:
+                n = CFRChanceNode(child, node) if child.isChance() else CFRNode(child, node)
+                node.children.append(n)
+                nodes_to_expand.append(n)
 
     def isLeaf(self):
         return self.is_leaf
 
+    def getSequence(self, player):
+        """
+        Returns the sequence (dict:{infoid: subsequent action}) of actions (for a given player, or for all the players
+        if None) that leads to this node, as Node.getSequence does on the base tree.
+        """
+
+        sequence = []
+        node = self
+        while(node.parent != None):
+            if(not node.parent.isChance() and (player == None or node.parent.player == player)):
+                sequence.append((node.parent.information_set.id, node.incoming_action))
+            node = node.parent
+        return dict(reversed(sequence))
+
     def isChance(self):
         return False
 
@@ -333,7 +469,7 @@ class CFRNode:
         """
 
         if(self.isLeaf()):
-            return str(self.visits / norm_factor) + ":" + str(self.base_node) + "\n"
+            return str(self.visits / norm_factor) + ":" + str(self.base_node if self.base_node != None else self.id) + "\n"
         else:
             return reduce(lambda x, y: x + y,
                           map(lambda i: i.getLeafDistribution(norm_factor), self.children))
@@ -346,11 +482,11 @@ class CFRNode:
         # print(self.information_set.id)
         if(self.isLeaf()):
             return self.utility
-        elif(self.information_set.id not in actionPlan):
+        elif(actionPlan[self.information_set.index] < 0):
             return default
         else:
             # ??????????????????????????????????????????????????
-            return self.children[actionPlan[self.information_set.id]].utilityFromActionPlan(actionPlan, default)
+            return self.children[actionPlan[self.information_set.index]].utilityFromActionPlan(actionPlan, default)
 # added
     def icfrutilityFromActionPlan(self, actionPlan, rootiset, p = 1, default=None):
         if (self.isLeaf()):
@@ -359,7 +495,7 @@ class CFRNode:
         if (rootiset is not None and iset.player == rootiset.player):
             # return np.zeros(len(self.children))
         # if (rootiset.id == self.information_set.id):
-           return self.children[actionPlan[iset.id]].icfrutilityFromActionPlan(actionPlan, rootiset)
+           return self.children[actionPlan[iset.index]].icfrutilityFromActionPlan(actionPlan, rootiset)
  
         u = None
         # s = self.information
@@ -414,7 +550,8 @@ class CFRNode:
     def utilityFromModifiedActionPlan(self, actionPlan, modification, default = None):
         """
         Return the utility from the leaf reached following a modification of actionPlan and starting from this node.
-        Action listed in modification are followed first, if no one is found then actionPlan is followed.
+        Action listed in modification (a dictionary from information set id to action) are followed first, if no one
+        is found then actionPlan is followed.
         If no leaf is reached, return the default value.
         """
 
@@ -422,6 +559,7 @@ class CFRNode:
             return self.utility
 
         id = self.information_set.id
+        index = self.information_set.index
 
         if(id in modification and modification[id] >= 0):
             # As if actionPlan[id] was overwritten
@@ -429,8 +567,8 @@ class CFRNode:
         if(id in modification and modification[id] < 0):
             # As if actionPlan[id] was deleted
             return default
-        if(id in actionPlan):
-            return self.children[actionPlan[id]].utilityFromModifiedActionPlan(actionPlan, modification, default)
+        if(actionPlan[index] >= 0):
+            return self.children[actionPlan[index]].utilityFromModifiedActionPlan(actionPlan, modification, default)
 
         return default
 
@@ -445,7 +583,7 @@ class CFRNode:
 
         self.information_set.reachability = max(self.information_set.reachability, pi[self.player])
 
-        sampled_action = actionPlan[self.information_set.id]
+        sampled_action = actionPlan[self.information_set.index]
 
         for a in range(len(self.children)):
             if a == sampled_action:
@@ -479,7 +617,7 @@ class CFRNode:
         terminals = []
 
         if targetPlayer == None or self.player == targetPlayer:
-            action = plan[self.information_set.id]
+            action = plan[self.information_set.index]
             terminals = self.children[action].terminalsUnderPlan(targetPlayer, plan)
         else:
             for node in self.children:
@@ -487,37 +625,6 @@ class CFRNode:
 
         return terminals
 
-# good stuff
-    def isActionPlanLeadingToInfoset(self, actionPlan, targetInfoset):
-        """
-        Returns true if the path obtained by the given action plan leads to the target information set.
-        """
-
-        if(self.information_set == targetInfoset):
-            return True
-
-        if(not self.information_set.id in actionPlan):
-            return False
-
-        action = actionPlan[self.information_set.id]
-
-        if(action == -1 or self.children[action].isLeaf()):
-            return False
-        else:
-            return self.children[action].isActionPlanLeadingToInfoset(actionPlan, targetInfoset)
-    
-    def isActionPlanLeadingToLeaf(self, root, actionPlan, leaf):
-        if (self.isLeaf()):
-            if (self == leaf):
-                return True
-            else:
-                return False
-        action = actionPlan[self.information_set.id]
-        if (self.player == root.player):
-            return self.children[action].isActionPlanLeadingToLeaf(root, actionPlan, leaf)
-        else:
-            return self.children[action].isActionPlanLeadingToLeaf(root, actionPlan, leaf)
-
     def clearMarginalizedUtility(self):
         """
         Clear the marginalized utility in the leaves.
@@ -541,7 +648,7 @@ class CFRNode:
             for child in self.children:
                 child.marginalizePlayer(actionPlan, frequency, marginalized_player)
         else:
-            self.children[actionPlan[self.information_set.id]].marginalizePlayer(actionPlan, frequency, marginalized_player)
+            self.children[actionPlan[self.information_set.index]].marginalizePlayer(actionPlan, frequency, marginalized_player)
 # ?
     def marginalizePlayerFromBehaviourals(self, p, marginalized_player):
         """
@@ -559,55 +666,6 @@ class CFRNode:
             for a in range(len(self.children)):
                 self.children[a].marginalizePlayerFromBehaviourals(p * s[a], marginalized_player)
 
-    def isPiInInfoset(self, actionplan, infoset, player):
-        if (self.isLeaf()):
-            return False
-
-        iset = self.information_set
-
-        if (self.information_set == infoset):
-            return True
-
-        if (self.player == player):
-            return self.children[actionplan[iset.id]].isPiInInfoset(actionplan, infoset, player)
-        else:
-            ans = False
-            for a in range(len(self.children)):
-                ans = ans or self.children[a].isPiInInfoset(actionplan, infoset, player)
-            return ans
-
-
-    def isPiInLeaf(self, leaf, actionplan, player):
-        if (self.isLeaf()):
-            if (self == leaf):
-                return True
-            else:
-                return False
-        iset = self.information_set
-        if (self.player == player):
-            return self.children[actionplan[iset.id]].isPiInLeaf(leaf, actionplan, player)
-        else:
-            ans = False
-            for a in range(len(self.children)):
-                ans = ans or self.children[a].isPiInLeaf(leaf, actionplan, player)
-            return ans
-
-
-    def isPiMinusIInLeaf(self, leaf, actionplan, player):
-        if (self.isLeaf()):
-            if (self == leaf):
-                return True
-            else:
-                return False
-        iset = self.information_set
-        if (self.player != player):
-            return self.children[actionplan[iset.id]].isPiMinusIInLeaf(leaf, actionplan, player)
-        else:
-            ans = False
-            for a in range(len(self.children)):
-                ans = ans or self.children[a].isPiMinusIInLeaf(leaf, actionplan, player)
-            return ans
-
     def getChildrenInformationSets(self, action, player):
         """
         Get all the information sets of the given player directly reachable (e.g. no other infoset of the same player in between)
@@ -669,64 +727,18 @@ class CFRNode:
                     u[p] += child_u[p] * s[a]
 
         return u
-    
-    def getEpsilon(self, tree, t, a, player):
-        # epsilon relating to the specific informationset
-        DeviU = self.getExpectedDeviatedUtility(t, a, tree, player)
-        LattU = self.getLatter(t, tree, a, player) #Only calculate once
-        # if (self.information_set.id == 49):
-        # print(a, self.information_set.nodes[0].base_node.seq, self.information_set.nodes[0].base_node.actionNames[a], "Information set id:{}; sequence: {}, DeviatedUtility: {}, LatterUtility: {}".format(
-        #     self.information_set.id, self.information_set.sequence, DeviU, LattU
-        # ))
-        return (DeviU - LattU)
-    
-    def getExpectedDeviatedUtility(self, t, a, tree:CFRTree, player):
-        '''
-        returns one value of delta of this node 
-        '''
-        u = 0
-        iset = self.information_set
-        childleaves = []
-        for i in range(len(self.children)):
-            childleaves += list(iset.getTerminals(i))
-        for leaf in childleaves:
-            mu1 = 0
-            mu2 = 0
-            for string in tree.actionPlan:
-                actionplan = CFRJointStrategy.stringToActionPlan(string)
-                if (actionplan[iset.id] == a and tree.root.isPiInInfoset(actionplan, iset, player) is True and tree.root.isPiMinusIInLeaf(leaf, actionplan, player)):
-                    mu1 += tree.actionPlan[string][0] / t
-            # for string in tree.actionPlan:
-                # actionplan = CFRJointStrategy.stringToActionPlan(string)
-                if (tree.root.isPiInLeaf(leaf, actionplan, player) is True):
-                    mu2 += tree.actionPlan[string][1]
-            u += np.array(leaf.utility)[player] * mu1 * mu2 / len(tree.root.children)
-        return u
-
-    def getLatter(self, t, tree: CFRTree, a, player = 0):
-        '''
-        returns 1 values of informationset
-        '''
-        u = 0 
-        iset = self.information_set
-        childleaves = list(iset.getTerminals(a))
-        for leaf in childleaves:
-            mu = 0
-            for string in tree.actionPlan:
-                actionPlan = CFRJointStrategy.stringToActionPlan(string)
-                if (actionPlan[iset.id] == a and tree.root.isActionPlanLeadingToInfoset(actionPlan, self.information_set) is True and tree.root.isActionPlanLeadingToLeaf(self, actionPlan, leaf) is True):
-                    mu += tree.actionPlan[string][0] / t
-            u += np.array(leaf.utility)[player] * mu / len(tree.root.children)
-        return u
 
 class CFRChanceNode(CFRNode):
     """
     Wrapper around an extensive-form chance node for holding additional CFR-related code and data.
     """
 
+    __slots__ = ('distribution', 'cdf', 'action')
+
     def __init__(self, base_node, parent = None):
         CFRNode.__init__(self, base_node, parent)
         self.distribution = base_node.distribution
+        self.cdf = sampling.buildCDF(self.distribution)
         self.action = None
 
     def isChance(self):
@@ -737,14 +749,8 @@ class CFRChanceNode(CFRNode):
         Sample an action from the static distribution of this chance node.
         """
 
-        r = random.random()
-        count = 0
-
-        for i in range(len(self.distribution)):
-            count += self.distribution[i]
-            if(r < count):
-                self.action = i
-                return self.action
+        self.action = sampling.sampleFromCDF(self.cdf)
+        return self.action
 
     def computeReachability(self, actionPlan, pi):
         """
@@ -834,40 +840,6 @@ class CFRChanceNode(CFRNode):
 
         return u
 
-    def isActionPlanLeadingToInfoset(self, actionPlan, targetInfoset):
-        """
-        Returns true if the path obtained by the given action plan leads to the target information set.
-        """
-
-        res = False
-        for child in self.children:
-            res = res or child.isActionPlanLeadingToInfoset(actionPlan, targetInfoset)
-        return res
-    
-    def isPiInInfoset(self, actionplan, infoset, player):
-        res = False
-        for child in self.children:
-            res = res or child.isPiInInfoset(actionplan, infoset, player)
-        return res
-
-    def isPiInLeaf(self, leaf, actionplan, player):
-        res = False
-        for child in self.children:
-            res = res or child.isPiInLeaf(leaf, actionplan, player)
-        return res
-    
-    def isPiMinusIInLeaf(self, leaf, actionplan, player):
-        res = False
-        for child in self.children:
-            res = res or child.isPiMinusIInLeaf(leaf, actionplan, player)
-        return res
-
-    def isActionPlanLeadingToLeaf(self, root, actionPlan, leaf):
-        res = False
-        for child in self.children:
-            res = res or child.isActionPlanLeadingToLeaf(root, actionPlan, leaf)
-        return res
-
     def clearMarginalizedUtility(self):
         """
         Clear the marginalized utility in the leaves.
@@ -890,6 +862,12 @@ class CFRInformationSet:
     Represents an information set and all the code and data related to it when used for the CFR algorithm.
     """
 
+    __slots__ = ('id', 'index', 'player', 'action_count', 'sequence', 'nodes', 'cfr_tree', 'label', 'action_names',
+                 'children_infoset', 'children_leaves', 'cumulative_regret', 'cumulative_strategy', 'current_strategy',
+                 'strategy_cdf', 'infoset_table', 'table_row', 'cached_V', 'supportingPlanInfo',
+                 # ICFR
+                 'reachability', 'action', '_mu_T', 'external_id', 'utility', 'imm_utility', 'tag', 'update', 'epoch')
+
     def __init__(self, id, player, action_count, sequence, cfr_tree, random_initial_strategy = False):
         """
         Create an information set with a given id, player, action_count (i.e. number of actions available in its nodes),
@@ -899,23 +877,33 @@ class CFRInformationSet:
         """
 
         self.id = id
+        self.index = -1 # Dense index of this information set in its tree (set by CFRTree)
         self.player = player
         self.action_count = action_count
         self.sequence = sequence
         self.nodes = []
+        # Names of the information set and of its actions, for printing strategies (set by CFRTree)
+        self.label = str(id)
+        self.action_names = [str(a) for a in range(action_count)]
        
         self.cfr_tree = cfr_tree
 
         self.reachability = -1
 # icfr tag
         self.action = -1
-        self.inRM = InternalRM(self.action_count)
-        self.exRM = {}
-        self.externalsigma = ""
-        self.utility = [0] * 3
-        self.mu_T = np.zeros(action_count)
+        # mu_T is only used by ICFR, so it is created on first access. The regret minimizers of ICFR live in the
+        # RegretMinimizerBank of the tree: the internal one is in the row of this information set, while external_id
+        # is the id of the external one of the current trigger (-1 if none)
+        self._mu_T = None
+        self.external_id = -1
+        # Views on the utility buffers of the tree, created by ICFR (see icfr.initBuffers)
+        self.utility = None
+        self.imm_utility = None
         self.tag = False
         self.update = False
+        # ICFR iteration in which reachability, action, external_id, tag and update were last written: when it is not
+        # the current one of the tree, they count as cleared
+        self.epoch = -1
         # self.visits = [{}, {}]
         # self.visits = [[] * action_count] # maps all actions[0, 1] to visits of leaves;
         # self.children_leaves = []
@@ -942,12 +930,34 @@ class CFRInformationSet:
     def __repr__(self):
         return str(self)
 
+    @property
+    def mu_T(self):
+        if(self._mu_T is None):
+            self._mu_T = np.zeros(self.action_count)
+        return self._mu_T
+
+    @mu_T.setter
+    def mu_T(self, mu_T):
+        self._mu_T = mu_T
+
     def addNode(self, node):
         self.nodes.append(node)
 
+    def attachToTable(self, infoset_table, row):
+        """
+        Store the regrets and strategies of this information set in the given row of an InfosetTable.
+        From now on cumulative_regret, cumulative_strategy, current_strategy and strategy_cdf are views on that row.
+        """
+
+        self.infoset_table = infoset_table
+        self.table_row = row
+        (self.cumulative_regret, self.cumulative_strategy, self.current_strategy, self.strategy_cdf) = \
+            infoset_table.views(row, self.action_count)
+
     def updateCurrentStrategy(self):
         """
         Recalculate the current strategy based on the cumulative regret.
+        (CFRTree.updateCurrentStrategies does the same for all the information sets at once.)
         """
 
         sum = reduce(lambda x, y: x + max(0, y), self.cumulative_regret, 0)
@@ -957,20 +967,24 @@ class CFRInformationSet:
                 self.current_strategy[a] = max(0, self.cumulative_regret[a]) / sum
             else:
                 self.current_strategy[a] = 1 / self.action_count
+
+        self.infoset_table.refreshStrategyCDF(self.table_row)
 # ?
     def getAverageStrategy(self):
         """
         Get the average strategy experienced so far.
         """
 
-        # norm = reduce(lambda x, y: x + y, self.cumulative_strategy)
-        # if(norm > 0):
-        #     return [self.cumulative_strategy[a] / norm for a in range(self.action_count)]
-        # else:
-        #     return [1 / self.action_count for a in range(self.action_count)]
+        # ICFR keeps its empirical frequencies in mu_T; CFR-based solvers never create it
+        if (self._mu_T is None):
+            norm = reduce(lambda x, y: x + y, self.cumulative_strategy)
+            if(norm > 0):
+                return self.cumulative_strategy / norm
+            else:
+                return np.ones(self.action_count) / self.action_count
         # print(self.mu_T)
         if (np.sum(self.mu_T) == 0):
-            return np.array([0.5, 0.5])
+            return np.ones(self.action_count) / self.action_count
         else:
             return self.mu_T / np.sum(self.mu_T)
 
@@ -988,22 +1002,20 @@ class CFRInformationSet:
         if(self.nodes[0].isChance()):
             return self.nodes[0].sampleAction()
 
-        r = random.random()
-        count = 0
-
-        for i in range(len(self.current_strategy)):
-            count += self.current_strategy[i]
-            if(r < count):
-                return i
+        return sampling.sampleFromCDF(self.strategy_cdf)
 # ? counterfactual value
     def V(self):
+        if(self.cached_V != None and self.cached_V[0] == self.cfr_tree.V_epoch):
+            return self.cached_V[1]
+
         v = [0 for a in range(self.action_count)]
 
         for a in range(self.action_count):
             v[a] += sum(map(lambda i: i.V(), self.children_infoset[a]))
             v[a] += sum(map(lambda l: l.marginalized_utility, self.children_leaves[a]))
 
-        return max(v)
+        self.cached_V = (self.cfr_tree.V_epoch, max(v))
+        return self.cached_V[1]
 
     def getChildrenOfPlayer(self, player):
         """
@@ -1090,7 +1102,7 @@ class CFRInformationSet:
     def computeReachability(self, actionPlan):
 
         self.reachability = 1
-        sampled_action = actionPlan[self.id]
+        sampled_action = actionPlan[self.index]
 
         for iset in self.children_infoset[sampled_action]:
             iset.computeReachability(actionPlan)
@@ -1100,102 +1112,291 @@ class CFRJointStrategy:
     A joint strategy progressively built by the SCFR algorithm.
     """
 
-    def __init__(self, maxPlanCount = -1):
+    def __init__(self, maxPlanCount = -1, cfr_tree = None):
         """
         Create a joint strategy able to hold a maximum of maxPlanCount plans.
         If the value is not given, it is able to hold an arbitrary number of plans.
+        If the CFRTree the plans belong to is given, the joint strategy also keeps the leaf weights of its plans
+        (see getLeafWeights), so that the tree can evaluate it without visiting every plan.
         """
 
         self.maxPlanCount = maxPlanCount
         self.frequencyCount = 0
         self.plans = {}
 
-        CFRJointStrategy.action_plans_cache = {}
+        # When the size is bounded, the plans are also kept in a min-heap by (frequency, insertion order), so that the
+        # least frequent one (the first inserted among ties) can be evicted without scanning all of them. The mass of
+        # an evicted plan is spread over the kept ones (see rescalePlans), so frequencyCount stays the mass added so far
+        self.plan_heap = IndexedMinHeap() if maxPlanCount != -1 else None
+        self.insertion_count = 0
+        self.evictions = 0
+        self.evicted_mass = 0
+
+        # Joint distributions added in factored form (see addFactoredDistribution), never expanded into self.plans
+        self.components = []
+        # Distinct joint plans of the components, as tuples holding the id of the plan of each player (given to the
+        # plans of each player in order of appearance), so that supportSize does not have to expand them
+        self.component_support = set()
+        self.player_plan_ids = []
+
+        self.cfr_tree = cfr_tree
+        self.leaf_weights = None
+        # The leaf weights and the weights of the pending plans are stored divided by leaf_scale, so that rescalePlans
+        # does not have to fold the pending plans to rescale them
+        self.leaf_scale = 1
+        # (actionPlan, weight) pairs and factored components not yet added to the leaf weights
+        self.pending_plans = []
+        self.pending_components = []
+        if(cfr_tree != None):
+            flat = cfr_tree.getFlatTree()
+            self.leaf_weights = np.zeros((flat.numOfPlayers + 1, flat.leaf_count))
 
     def addActionPlan(self, actionPlan, weight = 1):
         """
-        Add an action plan (a dictionary from information set id to action) to the joint strategy.
+        Add an action plan (an array holding the action of each information set, by dense index) to the joint strategy.
         Optionally a weight can be provided, to insert non-uniformly sampled plans.
+        If the joint strategy is full, the least frequent plan is evicted and the kept ones are rescaled to take its
+        mass, so that the joint strategy is the distribution of the plans conditioned on the kept ones.
         """
 
-        string = CFRJointStrategy.actionPlanToString(actionPlan)
+        key = CFRJointStrategy.actionPlanToKey(actionPlan)
 
-        if(string in self.plans):
-            self.plans[string] += weight
-            self.frequencyCount += weight
-        elif(self.maxPlanCount == -1 or len(self.plans) < self.maxPlanCount):
-            self.plans[string] = weight
+        if(key in self.plans):
+            self.plans[key] += weight
             self.frequencyCount += weight
+            if(self.plan_heap != None):
+                (_, order) = self.plan_heap.priority(key)
+                self.plan_heap.update(key, (self.plans[key], order))
         else:
-            # Remove the least frequent plan
-            plan = min(self.plans, key = lambda p: self.plans[p])
-            self.frequencyCount -= self.plans[plan]
-            del self.plans[plan]
+            if(self.maxPlanCount != -1 and len(self.plans) >= self.maxPlanCount):
+                # Remove the least frequent plan, and give its mass to the kept ones
+                (plan, _) = self.plan_heap.pop()
+                mass = self.plans.pop(plan)
+                self.evictions += 1
+                self.evicted_mass += mass
+                self.trackActionPlan(CFRJointStrategy.keyToActionPlan(plan), -mass)
+                if(len(self.plans) > 0):
+                    self.rescalePlans(self.frequencyCount / (self.frequencyCount - mass))
+                else:
+                    self.frequencyCount -= mass
 
             # Add the new one
-            self.plans[string] = weight
+            self.plans[key] = weight
             self.frequencyCount += weight
+            if(self.plan_heap != None):
+                self.plan_heap.push(key, (weight, self.insertion_count))
+                self.insertion_count += 1
 
-    def addJointDistribution(self, jointDistribution):
+        self.trackActionPlan(actionPlan, weight)
+
+    # Value of leaf_scale above which the pending plans are folded into the leaf weights, to keep it bounded
+    leaf_scale_limit = 1e6
+
+    def rescalePlans(self, factor):
+        """
+        Multiply the weight of every plan (and the leaf weights) by the given factor, leaving frequencyCount unchanged.
+        The order of the plans by frequency does not change, so the heap is not rebuilt.
         """
 
+        for key in self.plans:
+            self.plans[key] *= factor
+        self.plan_heap.mapPriorities(lambda priority: (priority[0] * factor, priority[1]))
+
+        self.leaf_scale *= factor
+        if(self.leaf_weights is not None and self.leaf_scale > CFRJointStrategy.leaf_scale_limit):
+            self.getLeafWeights()
+
+    def addFactoredDistribution(self, playerDistributions):
+        """
+        Add a joint distribution given in factored form (as returned by CFRTree.buildFactoredJointFromMarginals): a
+        (plans, weights) pair for each player, the joint distribution being the product of the per-player ones.
+        The joint plans of the product are not built: the leaf weights are computed from the per-player factors, and
+        the plans are only expanded on request by expandedPlans, or right away if the size of the joint strategy is
+        bounded.
         """
 
-        for (plan, prob) in jointDistribution:
-            self.addActionPlan(plan, prob)
+        if(self.maxPlanCount != -1):
+            self.addJointDistribution(CFRJointStrategy.productPlans(playerDistributions))
+            return
 
-    def actionPlanToString(actionPlan):
+        component = [(np.asarray(plans, dtype = ACTION_PLAN_DTYPE), np.asarray(weights, dtype = float))
+                     for (plans, weights) in playerDistributions]
+        self.components.append(component)
+        self.frequencyCount += math.prod(weights.sum() for (_, weights) in component)
+        if(self.leaf_weights is not None):
+            self.pending_components.append(component)
+
+        self.component_support.update(itertools.product(*[self.playerPlanIds(p, plans)
+                                                          for (p, (plans, _)) in enumerate(component)]))
+
+    def playerPlanIds(self, player, plans):
         """
-        Transform an action plan in dictionary representation to the corresponding string representation.
+        Get the ids of the given plans of a player (the ones of a factored component), giving new ids to the plans seen
+        for the first time.
         """
 
-        string = ""
+        while(len(self.player_plan_ids) <= player):
+            self.player_plan_ids.append({})
+        ids = self.player_plan_ids[player]
+        return [ids.setdefault(CFRJointStrategy.actionPlanToKey(plan), len(ids)) for plan in plans]
 
-        for infoset in actionPlan:
-            string += "a" + str(infoset) + "." + str(actionPlan[infoset])
+    def expandedPlans(self):
+        """
+        Get a dict with the weight of each joint plan of the joint strategy, including the ones of the factored
+        components added so far. The expansion is built for the caller only and is not stored.
+        """
+
+        if(len(self.components) == 0):
+            return self.plans
+
+        plans = dict(self.plans)
+        for component in self.components:
+            for (plan, weight) in CFRJointStrategy.productPlans(component):
+                key = CFRJointStrategy.actionPlanToKey(plan)
+                plans[key] = plans.get(key, 0) + weight
+        return plans
+
+    def supportSize(self):
+        """
+        Get the number of distinct plans of the joint strategy. The joint plans of the factored components are counted
+        as tuples of per-player plans, without expanding them. The plans added one by one are split into their
+        per-player parts, to find the ones also in some component, when the tree of the joint strategy is known (the
+        two are otherwise counted separately).
+        """
+
+        if(len(self.components) == 0):
+            return len(self.plans)
+        if(len(self.plans) == 0 or self.cfr_tree == None):
+            return len(self.component_support) + len(self.plans)
 
-        return string
+        infoset_player = self.cfr_tree.getFlatTree().infoset_player
+        player_count = len(self.player_plan_ids)
+        support = set(self.component_support)
+        for key in self.plans:
+            plan = CFRJointStrategy.keyToActionPlan(key)
+            support.add(tuple(self.playerPlanIds(p, [np.where(infoset_player == p, plan, -1)])[0]
+                              for p in range(player_count)))
+        return len(support)
 
-    action_plans_cache = {}
+    def trackActionPlan(self, actionPlan, weight):
+        """
+        Schedule the addition of the given weight (possibly negative) of an action plan to the leaf weights.
+        """
 
-    def stringToActionPlan(string):
+        if(self.leaf_weights is not None):
+            self.pending_plans.append((actionPlan, weight / self.leaf_scale))
+
+    def getLeafWeights(self):
         """
-        Transform an action plan in string representation to the corresponding dictionary representation.
+        Get the (numOfPlayers + 1, leaves) matrix of the (unnormalized) leaf weights of the joint strategy, in the leaf
+        order of the flat representation of its tree. For p < numOfPlayers, row p holds the total frequency of the
+        plans reaching each leaf when player p is free to play any action, multiplied by the probability of chance
+        reaching it; the last row does the same when all the players follow the plans.
+        The plans added since the last call are folded into the matrix in batches.
         """
 
-        if(string in CFRJointStrategy.action_plans_cache):
-            return CFRJointStrategy.action_plans_cache[string]
+        if(len(self.pending_plans) > 0):
+            flat = self.cfr_tree.getFlatTree()
+            chance_reach = flat.chance_reach[flat.leaves]
+
+            # Bound the size of the boolean reach arrays built for each batch
+            batch_size = max(1, (1 << 24) // ((flat.numOfPlayers + 1) * flat.node_count))
+            for start in range(0, len(self.pending_plans), batch_size):
+                batch = self.pending_plans[start:start + batch_size]
+                plans = np.array([plan for (plan, _) in batch])
+                weights = np.array([weight for (_, weight) in batch], dtype = float)
+                reach = flat.plansLeafReach(plans)
+                self.leaf_weights += np.einsum('k,kpl->pl', weights, reach) * chance_reach
+
+            self.pending_plans = []
+
+        if(self.leaf_scale != 1):
+            self.leaf_weights *= self.leaf_scale
+            self.leaf_scale = 1
+
+        if(len(self.pending_components) > 0):
+            flat = self.cfr_tree.getFlatTree()
+            chance_reach = flat.chance_reach[flat.leaves]
+            n_players = flat.numOfPlayers
 
-        actions = string.split("a")[1:]
-        actionPlan = {}
+            for component in self.pending_components:
+                # Weight of the plans of each player reaching each leaf when that player follows them, and total
+                # weight of the plans of each player (all of them reach the leaf when the player is free)
+                own = np.array([weights @ flat.plansOwnLeafReach(plans)[:, p]
+                                for (p, (plans, weights)) in enumerate(component)])
+                totals = np.array([weights.sum() for (_, weights) in component])
 
-        for a in actions:
-            (infoset, action) = a.split(".")
-            actionPlan[int(infoset)] = int(action)
+                component_weights = np.empty((n_players + 1, flat.leaf_count))
+                for q in range(n_players):
+                    component_weights[q] = totals[q] * np.prod(np.delete(own, q, axis = 0), axis = 0)
+                component_weights[n_players] = np.prod(own, axis = 0)
+                self.leaf_weights += component_weights * chance_reach
 
-        CFRJointStrategy.action_plans_cache[string] = actionPlan
+            self.pending_components = []
 
-        return actionPlan
+        return self.leaf_weights
 
-    def reduceActionPlan(actionPlan, tree):
+    def addJointDistribution(self, jointDistribution):
         """
-        Transform an action plan into a reduced one, in the given tree.
+
+        """
+
+        for (plan, prob) in jointDistribution:
+            self.addActionPlan(plan, prob)
+
+    def productPlans(playerDistributions):
+        """
+        Get the list of the (plan, probability) pairs of the product of the given per-player (plans, weights)
+        distributions, the plans of different players setting disjoint information sets.
+        """
+
+        joint_distribution = [(plan, weight) for (plan, weight) in zip(*playerDistributions[0])]
+
+        for (plans, weights) in playerDistributions[1:]:
+            new_joint_distribution = []
+            for j in joint_distribution:
+                for d in zip(plans, weights):
+                    joint_plan = np.where(d[0] >= 0, d[0], j[0])
+                    joint_probability = j[1] * d[1]
+                    new_joint_distribution.append((joint_plan, joint_probability))
+            joint_distribution = new_joint_distribution
+
+        return joint_distribution
+
+    def actionPlanToKey(actionPlan):
+        """
+        Transform an action plan into the bytes key identifying it in dictionaries.
+        """
+
+        return np.asarray(actionPlan, dtype = ACTION_PLAN_DTYPE).tobytes()
+
+    def keyToActionPlan(key):
         """
+        Transform a bytes key back into the corresponding (read-only) action plan.
+        """
+
+        return np.frombuffer(key, dtype = ACTION_PLAN_DTYPE)
 
-        reducedActionPlan = {}
+    # Maximum number of entries of a reduction memo, after which it is cleared
+    reduction_memo_size = 1 << 16
 
-        for iset in tree.information_sets.values():
-            iset.reachability = 0
+    def reduceActionPlan(actionPlan, tree, memo = None):
+        """
+        Transform an action plan into a reduced one, in the given tree.
+        The reduction is a single pass over the information sets, ordered by the length of their sequence (see
+        FlatCFRTree.reducePlans). If a memo dictionary is given, reduced plans are looked up and stored in it by key.
+        """
 
-        #tree.root.computeReachability(actionPlan, [1 for _ in range(tree.numOfPlayers)])
+        if(memo != None):
+            key = CFRJointStrategy.actionPlanToKey(actionPlan)
+            if(key in memo):
+                return memo[key]
+            if(len(memo) >= CFRJointStrategy.reduction_memo_size):
+                memo.clear()
 
-        for iset in tree.information_sets.values():
-            if len(iset.sequence) == 0:
-                iset.computeReachability(actionPlan)
+        reducedActionPlan = tree.getFlatTree().reducePlans(np.asarray(actionPlan, dtype = ACTION_PLAN_DTYPE))
 
-        for (id, iset) in tree.information_sets.items():
-            # reachability = max(map(lambda n: n.reachability, iset.nodes))
-            if(iset.reachability > 0):
-                reducedActionPlan[id] = actionPlan[id]
+        if(memo != None):
+            memo[key] = reducedActionPlan
 
-        return reducedActionPlan
\ No newline at end of file
+        return reducedActionPlan
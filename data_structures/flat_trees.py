@@ -0,0 +1,312 @@
+import numpy as np
+
+class FlatCFRTree:
+    """
+    Array-backed (flat) representation of a CFRTree.
+    Nodes are stored in breadth-first order, so that the nodes at the same depth are contiguous and the children of
+    each node are contiguous as well. Information sets are identified by a dense index (the same one stored in
+    CFRInformationSet.index), so that per-infoset data can be kept in arrays of shape (infosets, actions).
+    """
+
+    def __init__(self, cfr_tree):
+        """
+        Compile the object graph of the given CFRTree into flat NumPy arrays.
+        """
+
+        self.numOfPlayers = cfr_tree.numOfPlayers
+
+        # Information sets, in dense index order
+        self.infosets = sorted(cfr_tree.information_sets.values(), key = lambda i: i.index)
+        self.infoset_count = len(self.infosets)
+        self.infoset_ids = np.array([iset.id for iset in self.infosets], dtype = np.int64)
+        self.infoset_player = np.array([iset.player for iset in self.infosets], dtype = np.int32)
+        self.infoset_action_count = np.array([iset.action_count for iset in self.infosets], dtype = np.int32)
+        self.max_action_count = int(self.infoset_action_count.max()) if self.infoset_count > 0 else 0
+
+        # Mask of the valid (infoset, action) cells of a padded (infosets, max_action_count) array
+        self.action_mask = np.arange(self.max_action_count)[None, :] < self.infoset_action_count[:, None]
+
+        # Breadth-first visit of the object graph
+        nodes = [ cfr_tree.root ]
+        parent = [ -1 ]
+        child_offset = []
+        child_count = []
+
+        i = 0
+        while(i < len(nodes)):
+            node = nodes[i]
+            child_offset.append(len(nodes))
+            child_count.append(len(node.children))
+            for child in node.children:
+                nodes.append(child)
+                parent.append(i)
+            i += 1
+
+        self.nodes = nodes
+        self.node_count = len(nodes)
+        self.node_index = { node: i for (i, node) in enumerate(nodes) }
+        self.node_ids = np.array([n.id for n in nodes], dtype = np.int64)
+        self.parent = np.array(parent, dtype = np.int32)
+        self.child_offset = np.array(child_offset, dtype = np.int32)
+        self.child_count = np.array(child_count, dtype = np.int32)
+        self.player = np.array([n.player for n in nodes], dtype = np.int32)
+        self.is_chance = np.array([n.isChance() for n in nodes], dtype = bool)
+        self.is_leaf = self.child_count == 0
+        self.infoset = np.array([-1 if (n.isChance() or n.isLeaf()) else n.information_set.index for n in nodes],
+                                dtype = np.int32)
+        self.incoming_action = np.array([-1] + [n.incoming_action for n in nodes[1:]], dtype = np.int32)
+
+        self.depth = np.zeros(self.node_count, dtype = np.int32)
+        for i in range(1, self.node_count):
+            self.depth[i] = self.depth[self.parent[i]] + 1
+        self.max_depth = int(self.depth[-1])
+        # Nodes at depth d are the ones in range(level_offsets[d], level_offsets[d+1])
+        self.level_offsets = np.searchsorted(self.depth, np.arange(self.max_depth + 2)).astype(np.int32)
+
+        # Data about the edge (parent -> node) leading to each node
+        self.chance_probability = np.ones(self.node_count)
+        self.edge_infoset = np.full(self.node_count, -1, dtype = np.int32)
+        self.edge_player = np.full(self.node_count, -1, dtype = np.int32)
+        for i in range(1, self.node_count):
+            p = self.parent[i]
+            if(self.is_chance[p]):
+                self.chance_probability[i] = nodes[p].distribution[self.incoming_action[i]]
+            else:
+                self.edge_infoset[i] = self.infoset[p]
+                self.edge_player[i] = self.player[p]
+        self.decision_edges = np.nonzero(self.edge_infoset >= 0)[0]
+        self.chance_edges = np.nonzero((self.edge_infoset < 0) & (self.parent >= 0))[0]
+
+        # Internal chance nodes, with the cumulative distributions of their actions (padded with inf, so that padding
+        # actions are never drawn by sampling.sampleRowsFromCDFs) and the index of their last action
+        self.chance_nodes = np.nonzero(self.is_chance & (self.child_count > 0))[0]
+        chance_width = int(self.child_count[self.chance_nodes].max()) if len(self.chance_nodes) > 0 else 0
+        self.chance_cdf = np.full((len(self.chance_nodes), chance_width), np.inf)
+        for (i, c) in enumerate(self.chance_nodes):
+            self.chance_cdf[i, :self.child_count[c]] = np.cumsum(nodes[c].distribution)
+        self.chance_last_action = self.child_count[self.chance_nodes] - 1
+
+        # Probability that chance plays all its actions on the path to each node
+        self.chance_reach = self.chance_probability.copy()
+        for d in range(1, self.max_depth + 1):
+            lo, hi = self.levelRange(d)
+            self.chance_reach[lo:hi] *= self.chance_reach[self.parent[lo:hi]]
+
+        # Leaves and their utility matrix
+        self.leaves = np.nonzero(self.is_leaf)[0].astype(np.int32)
+        self.leaf_count = len(self.leaves)
+        self.leaf_index = np.full(self.node_count, -1, dtype = np.int32)
+        self.leaf_index[self.leaves] = np.arange(self.leaf_count, dtype = np.int32)
+        self.leaf_utility = np.array([nodes[l].utility for l in self.leaves], dtype = float).reshape(self.leaf_count,
+                                                                                                   self.numOfPlayers)
+
+        # Last (infoset, action) cell played by each player on the path to each node (-1 for the empty sequence),
+        # where the cell of action a in the infoset with index i is i * max_action_count + a
+        self.player_sequence = np.full((self.numOfPlayers, self.node_count), -1, dtype = np.int64)
+        e = self.decision_edges
+        cell = np.full(self.node_count, -1, dtype = np.int64)
+        cell[e] = self.cell(self.edge_infoset[e].astype(np.int64), self.incoming_action[e])
+        for d in range(1, self.max_depth + 1):
+            lo, hi = self.levelRange(d)
+            self.player_sequence[:, lo:hi] = self.player_sequence[:, self.parent[lo:hi]]
+            acting = self.edge_player[lo:hi]
+            for p in range(self.numOfPlayers):
+                mask = acting == p
+                self.player_sequence[p, lo:hi][mask] = cell[lo:hi][mask]
+
+        # Parent sequence (last cell of the same player) and sequence length of each information set.
+        # With perfect recall all the nodes of an information set share the same sequence, so any of them can be used.
+        some_node = np.zeros(self.infoset_count, dtype = np.int64)
+        decision_nodes = np.nonzero(self.infoset >= 0)[0]
+        some_node[self.infoset[decision_nodes]] = decision_nodes
+        self.infoset_parent_sequence = self.player_sequence[self.infoset_player, some_node]
+        self.infoset_sequence_length = np.array([len(iset.sequence) for iset in self.infosets], dtype = np.int32)
+
+        # Parent information set (of the same player) and action leading to each information set, -1 for the roots
+        has_parent = self.infoset_parent_sequence >= 0
+        self.infoset_parent = np.where(has_parent, self.infoset_parent_sequence // max(self.max_action_count, 1), -1)
+        self.infoset_parent_action = np.where(has_parent, self.infoset_parent_sequence % max(self.max_action_count, 1), -1)
+        # Information sets grouped by increasing sequence length: each group only depends on the previous ones
+        self.sequence_levels = [np.nonzero(self.infoset_sequence_length == length)[0]
+                                for length in sorted(set(self.infoset_sequence_length.tolist()))]
+
+        # Leaves directly reachable by each sequence, i.e. (infoset, action) cell, with no other information set of
+        # the same player in between: sequence_leaves holds the (indices in leaves of the) leaves grouped by cell, and
+        # sequence_leaf_cells the cell of each entry. The child information sets of each cell are given by
+        # infoset_parent_sequence.
+        leaf_cells = self.player_sequence[:, self.leaves].reshape(-1)
+        leaf_entries = np.tile(np.arange(self.leaf_count, dtype = np.int32), self.numOfPlayers)
+        has_cell = leaf_cells >= 0
+        order = np.argsort(leaf_cells[has_cell], kind = 'stable')
+        self.sequence_leaves = leaf_entries[has_cell][order]
+        self.sequence_leaf_cells = leaf_cells[has_cell][order]
+
+        # Internal nodes of each level, used to sum the values of the children in the bottom-up passes
+        self.level_internal_nodes = []
+        for d in range(self.max_depth + 1):
+            lo, hi = self.level_offsets[d], self.level_offsets[d+1]
+            self.level_internal_nodes.append(lo + np.nonzero(self.child_count[lo:hi] > 0)[0].astype(np.int32))
+
+    def cell(self, infoset_index, action):
+        """
+        Returns the index of the (infoset, action) cell in a flattened (infosets, max_action_count) array.
+        """
+
+        return infoset_index * self.max_action_count + action
+
+    def levelRange(self, depth):
+        """
+        Returns the (start, end) indices of the nodes at the given depth.
+        """
+
+        return (int(self.level_offsets[depth]), int(self.level_offsets[depth + 1]))
+
+    def gatherStrategies(self, getter):
+        """
+        Build a padded (infosets, max_action_count) matrix with one row per information set, obtained by calling
+        getter on each CFRInformationSet (e.g. lambda i: i.current_strategy).
+        """
+
+        matrix = np.zeros((self.infoset_count, self.max_action_count))
+        for (i, iset) in enumerate(self.infosets):
+            matrix[i, :iset.action_count] = getter(iset)
+        return matrix
+
+    def edgeProbabilities(self, strategies):
+        """
+        Returns, for each node, the probability of the edge leading to it from its parent, given a padded
+        (infosets, max_action_count) matrix of behavioural strategies. The root has probability 1.
+        """
+
+        probabilities = self.chance_probability.copy()
+        e = self.decision_edges
+        probabilities[e] = strategies[self.edge_infoset[e], self.incoming_action[e]]
+        return probabilities
+
+    def reachProbabilities(self, edge_probabilities):
+        """
+        Returns a (numOfPlayers + 1, nodes) matrix with the contribution of each player (and of chance, in the last
+        row) to the probability of reaching each node, given the edge probabilities.
+        """
+
+        factors = np.ones((self.numOfPlayers + 1, self.node_count))
+        e = self.decision_edges
+        factors[self.edge_player[e], e] = edge_probabilities[e]
+        c = self.chance_edges
+        factors[self.numOfPlayers, c] = edge_probabilities[c]
+
+        reach = np.ones((self.numOfPlayers + 1, self.node_count))
+        for d in range(1, self.max_depth + 1):
+            lo, hi = self.levelRange(d)
+            reach[:, lo:hi] = reach[:, self.parent[lo:hi]] * factors[:, lo:hi]
+        return reach
+
+    def sumChildren(self, weighted_values, depth, out):
+        """
+        Sum the (already weighted) values of the children of each internal node at the given depth into out.
+        weighted_values and out have shape (rows, nodes).
+        """
+
+        internal = self.level_internal_nodes[depth]
+        if(len(internal) == 0):
+            return
+        lo, hi = self.levelRange(depth + 1)
+        out[:, internal] = np.add.reduceat(weighted_values[:, lo:hi], self.child_offset[internal] - lo, axis = 1)
+
+    def expectedValues(self, edge_probabilities):
+        """
+        Returns a (numOfPlayers, nodes) matrix with the expected utility of each player from each node on, given the
+        edge probabilities.
+        """
+
+        values = np.zeros((self.numOfPlayers, self.node_count))
+        values[:, self.leaves] = self.leaf_utility.T
+        weighted = np.zeros_like(values)
+
+        for d in range(self.max_depth - 1, -1, -1):
+            lo, hi = self.levelRange(d + 1)
+            weighted[:, lo:hi] = values[:, lo:hi] * edge_probabilities[lo:hi]
+            self.sumChildren(weighted, d, values)
+        return values
+
+    def getExpectedUtility(self, strategies):
+        """
+        Get the expected utility of each player at the root, given a padded matrix of behavioural strategies.
+        """
+
+        return self.expectedValues(self.edgeProbabilities(strategies))[:, 0]
+
+    def plansNodeReach(self, plans):
+        """
+        Given a (K, infosets) matrix of action plans (in array form), returns a boolean (K, numOfPlayers + 1, nodes)
+        array telling, for each plan, whether each node is reached when chance plays all its actions and:
+        - (rows p < numOfPlayers) every player but p follows the plan, while p plays all its actions;
+        - (row numOfPlayers) every player follows the plan.
+        """
+
+        n_players = self.numOfPlayers
+        e = self.decision_edges
+
+        # edge_ok[k, q, node] is True if the edge leading to node is compatible with plan k when q is free
+        edge_ok = np.ones((plans.shape[0], n_players + 1, self.node_count), dtype = bool)
+        follows = plans[:, self.edge_infoset[e]] == self.incoming_action[e]
+        free = self.edge_player[e][None, :] == np.arange(n_players + 1)[:, None]
+        edge_ok[:, :, e] = follows[:, None, :] | free[None, :, :]
+
+        reach = np.ones_like(edge_ok)
+        for d in range(1, self.max_depth + 1):
+            lo, hi = self.levelRange(d)
+            reach[:, :, lo:hi] = reach[:, :, self.parent[lo:hi]] & edge_ok[:, :, lo:hi]
+        return reach
+
+    def plansLeafReach(self, plans):
+        """
+        Same as plansNodeReach, restricted to the leaves: returns a boolean (K, numOfPlayers + 1, leaves) array.
+        """
+
+        return self.plansNodeReach(plans)[:, :, self.leaves]
+
+    def plansOwnLeafReach(self, plans, reached = None):
+        """
+        Given a (K, infosets) matrix of action plans, returns a boolean (K, numOfPlayers, leaves) array telling, for
+        each plan, whether each leaf is reached when player p follows the plan, while chance and the other players
+        play all their actions. reached is the result of reachedInfosets(plans), if already available.
+        """
+
+        if(reached is None):
+            reached = self.reachedInfosets(plans)
+        sequence = self.player_sequence[:, self.leaves]
+        infoset = np.maximum(sequence, 0) // max(self.max_action_count, 1)
+        action = sequence % max(self.max_action_count, 1)
+        follows = reached[:, infoset] & (plans[:, infoset] == action[None, :, :])
+        return follows | (sequence < 0)[None, :, :]
+
+    def reachedInfosets(self, plans):
+        """
+        Given an action plan (or a (K, infosets) matrix of action plans), returns a boolean array of the same shape
+        telling whether each information set can be reached when its player follows the plan (i.e. when each of its
+        ancestor information sets of the same player plays the action leading to it).
+        """
+
+        # Work with the information sets on the first axis, so that each level is a gather of whole rows
+        plans_t = plans.T
+        reached = np.zeros(plans_t.shape, dtype = bool)
+        extra_axes = (1,) * (plans.ndim - 1)
+
+        for level in self.sequence_levels:
+            parent = self.infoset_parent[level]
+            if(parent[0] < 0):
+                # Information sets at the root of the player (all the ones with the same sequence length are)
+                reached[level] = True
+                continue
+            action = self.infoset_parent_action[level].reshape((-1,) + extra_axes)
+            reached[level] = reached[parent] & (plans_t[parent] == action)
+        return reached.T
+
+    def reducePlans(self, plans):
+        """
+        Reduce an action plan (or a (K, infosets) matrix of action plans), setting to -1 the action of the information
+        sets that cannot be reached by their player under the plan.
+        """
+
+        return np.where(self.reachedInfosets(plans), plans, -1).astype(plans.dtype, copy = False)
@@ -0,0 +1,121 @@
+class IndexedMinHeap:
+    """
+    Binary min-heap of hashable items, each with a comparable priority.
+    The position of every item in the heap is tracked, so that the priority of an item already in the heap can be
+    changed (or the item removed) in O(log n), instead of rebuilding the heap.
+    """
+
+    def __init__(self):
+        """
+        Create an empty heap.
+        """
+
+        self.items = []
+        self.priorities = []
+        self.positions = {}
+
+    def __len__(self):
+        return len(self.items)
+
+    def __contains__(self, item):
+        return item in self.positions
+
+    def push(self, item, priority):
+        """
+        Insert an item (not already in the heap) with the given priority.
+        """
+
+        self.items.append(item)
+        self.priorities.append(priority)
+        self.positions[item] = len(self.items) - 1
+        self.siftUp(len(self.items) - 1)
+
+    def priority(self, item):
+        """
+        Get the priority of an item in the heap.
+        """
+
+        return self.priorities[self.positions[item]]
+
+    def update(self, item, priority):
+        """
+        Change the priority of an item already in the heap.
+        """
+
+        i = self.positions[item]
+        old_priority = self.priorities[i]
+        self.priorities[i] = priority
+
+        if(priority < old_priority):
+            self.siftUp(i)
+        else:
+            self.siftDown(i)
+
+    def mapPriorities(self, function):
+        """
+        Apply a function to the priority of every item. The function must preserve the order of the priorities (e.g.
+        scale them by a positive factor), so that the heap does not have to be rebuilt.
+        """
+
+        self.priorities = [function(priority) for priority in self.priorities]
+
+    def peek(self):
+        """
+        Get the (item, priority) pair with the lowest priority, without removing it.
+        """
+
+        return (self.items[0], self.priorities[0])
+
+    def pop(self):
+        """
+        Remove and return the (item, priority) pair with the lowest priority.
+        """
+
+        res = self.peek()
+        self.remove(res[0])
+        return res
+
+    def remove(self, item):
+        """
+        Remove an item from the heap.
+        """
+
+        i = self.positions.pop(item)
+        last = len(self.items) - 1
+
+        if(i != last):
+            self.items[i] = self.items[last]
+            self.priorities[i] = self.priorities[last]
+            self.positions[self.items[i]] = i
+        self.items.pop()
+        self.priorities.pop()
+
+        if(i < len(self.items)):
+            self.siftDown(i)
+            self.siftUp(i)
+
+    def swap(self, i, j):
+        self.items[i], self.items[j] = self.items[j], self.items[i]
+        self.priorities[i], self.priorities[j] = self.priorities[j], self.priorities[i]
+        self.positions[self.items[i]] = i
+        self.positions[self.items[j]] = j
+
+    def siftUp(self, i):
+        while(i > 0):
+            parent = (i - 1) // 2
+            if(self.priorities[i] >= self.priorities[parent]):
+                break
+            self.swap(i, parent)
+            i = parent
+
+    def siftDown(self, i):
+        n = len(self.items)
+        while(True):
+            smallest = i
+            for child in (2 * i + 1, 2 * i + 2):
+                if(child < n and self.priorities[child] < self.priorities[smallest]):
+                    smallest = child
+            if(smallest == i):
+                break
+            self.swap(i, smallest)
+            i = smallest
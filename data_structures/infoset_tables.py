@@ -0,0 +1,101 @@
+import numpy as np
+
+class InfosetTable:
+    """
+    Structure-of-arrays storage for the regrets and strategies of all the information sets of a tree.
+    Data is kept in contiguous arrays of shape (infosets, max_action_count), with one row per information set (in
+    dense index order) padded with zeros after its last action. Each CFRInformationSet attached to the table exposes
+    its cumulative_regret, cumulative_strategy and current_strategy as views on its own row.
+    The cumulative distribution of the current strategies (strategy_cdf, padded with the last cumulative value) is
+    kept for sampling, and refreshed whenever the current strategies are updated.
+    """
+
+    def __init__(self, information_sets):
+        """
+        Create a table for the given information sets (sorted by dense index), copying their current data and
+        attaching them to it.
+        """
+
+        self.infoset_count = len(information_sets)
+        self.action_count = np.array([iset.action_count for iset in information_sets], dtype = np.int32)
+        self.max_action_count = int(self.action_count.max()) if self.infoset_count > 0 else 0
+        self.last_action = self.action_count - 1
+        self.action_mask = np.arange(self.max_action_count)[None, :] < self.action_count[:, None]
+        self.uniform_strategy = self.action_mask / np.maximum(self.action_count, 1)[:, None]
+
+        shape = (self.infoset_count, self.max_action_count)
+        self.cumulative_regret = np.zeros(shape)
+        self.cumulative_strategy = np.zeros(shape)
+        self.current_strategy = np.zeros(shape)
+        self.strategy_cdf = np.zeros(shape)
+
+        for (row, iset) in enumerate(information_sets):
+            self.cumulative_regret[row, :iset.action_count] = iset.cumulative_regret
+            self.cumulative_strategy[row, :iset.action_count] = iset.cumulative_strategy
+            self.current_strategy[row, :iset.action_count] = iset.current_strategy
+            iset.attachToTable(self, row)
+
+        self.refreshStrategyCDF()
+
+    def views(self, row, action_count):
+        """
+        Returns the (cumulative_regret, cumulative_strategy, current_strategy, strategy_cdf) views on the given row.
+        """
+
+        return (self.cumulative_regret[row, :action_count],
+                self.cumulative_strategy[row, :action_count],
+                self.current_strategy[row, :action_count],
+                self.strategy_cdf[row, :action_count])
+
+    def rowLists(self):
+        """
+        Returns a list holding the (cumulative_regret, cumulative_strategy, current_strategy) of each row as Python
+        lists (padded as the arrays). Indexing them one element at a time is much faster than indexing the arrays, so
+        the recursive CFR traversals work on them; storeRowLists copies the updated values back.
+        """
+
+        return list(zip(self.cumulative_regret.tolist(), self.cumulative_strategy.tolist(),
+                        self.current_strategy.tolist()))
+
+    def storeRowLists(self, rows):
+        """
+        Copy the cumulative regrets and strategies of the lists returned by rowLists back into the table.
+        """
+
+        if(len(rows) > 0):
+            (cumulative_regret, cumulative_strategy, _) = zip(*rows)
+            self.cumulative_regret[:] = cumulative_regret
+            self.cumulative_strategy[:] = cumulative_strategy
+
+    def refreshStrategyCDF(self, row = None):
+        """
+        Recompute the cumulative distribution of the current strategy of the given row (of all of them if not given).
+        """
+
+        rows = slice(None) if row == None else slice(row, row + 1)
+        np.cumsum(self.current_strategy[rows], axis = 1, out = self.strategy_cdf[rows])
+
+    def updateCurrentStrategies(self):
+        """
+        Recalculate the current strategy of every information set based on the cumulative regret (regret matching).
+        The arrays are updated in place, so that the views held by the information sets stay valid.
+        """
+
+        positive_regret = np.maximum(self.cumulative_regret, 0)
+        positive_regret[~self.action_mask] = 0
+        norm = positive_regret.sum(axis = 1, keepdims = True)
+        np.divide(positive_regret, norm, out = self.current_strategy, where = norm > 0)
+        np.copyto(self.current_strategy, self.uniform_strategy, where = norm <= 0)
+        self.refreshStrategyCDF()
+
+    def discount(self, t, alpha, beta, gamma):
+        """
+        Discount the accumulated data after iteration t, as in Discounted CFR: positive regrets are multiplied by
+        t^alpha / (t^alpha + 1), negative regrets by t^beta / (t^beta + 1) and the cumulative strategy by
+        (t / (t + 1))^gamma. Linear CFR corresponds to alpha = beta = gamma = 1.
+        """
+
+        positive_weight = t ** alpha / (t ** alpha + 1)
+        negative_weight = t ** beta / (t ** beta + 1)
+        self.cumulative_regret *= np.where(self.cumulative_regret > 0, positive_weight, negative_weight)
+        self.cumulative_strategy *= (t / (t + 1)) ** gamma
@@ -1,6 +1,6 @@
 from cv2 import norm
 import numpy as np
-from scipy.linalg import null_space
+from data_structures import sampling
 
 
 class RegretMinimizer:
@@ -45,21 +45,20 @@ class RegretMinimizer:
         return averageStrategy
     
     def getAction(self, strategy):
-        preSumStrategy = np.zeros(strategy.size + 1)
-        for i in range(1, strategy.size + 1):
-            preSumStrategy[i] = preSumStrategy[i - 1] + strategy[i - 1]
-        left = 0
-        right = strategy.size
-        r = np.random.random()
-        while (left < right): 
-            mid = (left + right) //2
-            if (preSumStrategy[mid] >= r):
-                right = mid
-            else:
-                left = mid + 1
-        return right - 1
+        return sampling.sampleFromCDF(sampling.buildCDF(strategy))
 
 class InternalRM(RegretMinimizer):
+    '''
+    Internal regret minimizer: each row i of regretSum holds the regrets of swapping action i with the other actions.
+    The recommended strategy is the stationary distribution p of the Markov chain Q obtained by regret matching on
+    each row (p Q = p), found in closed form for up to 3 actions, by a direct solve for up to
+    DIRECT_SOLVE_MAX_ACTIONS actions and by power iteration (warm-started from the last p) otherwise.
+    Q and p are cached until observe changes regretSum.
+    '''
+    DIRECT_SOLVE_MAX_ACTIONS = 16
+    POWER_ITERATION_TOLERANCE = 1e-13
+    POWER_ITERATION_MAX_STEPS = 10000
+
     def __init__(self, actionNumbers = 2):
         self.actionNumbers = actionNumbers
         self.regretSum = np.zeros((actionNumbers, actionNumbers))
@@ -68,30 +67,101 @@ class InternalRM(RegretMinimizer):
         self.recommended_action = -1 
         self.rcmd_action = np.zeros(actionNumbers, dtype=int)
         self.p = None
+        self.Q = None # Regret-matching matrix of the current regretSum (None if it has to be recomputed)
     # ?
     def observe(self, utility):
-        for i in range(self.actionNumbers):
-            self.utility[i] = self.p[i] * utility
-            self.regretSum[i] = self.regretSum[i] + self.utility[i] - self.utility[i][self.recommended_action]
-            # print(self.rcmd_action[i])
-            # self.regretSum[i] = self.regretSum[i] + self.utility[i] - self.utility[i][self.rcmd_action[i]]
+        self.utility = self.p * np.asarray(utility).reshape(1, -1)
+        self.regretSum = self.regretSum + self.utility - self.utility[:, [self.recommended_action]]
+        self.Q = None
     
     def getStrategy(self):
-        AN_strategy = np.maximum(self.regretSum, 0)
-        normalizingStrategy = np.sum(AN_strategy, 1)
-        for i in range(AN_strategy.shape[0]):
-            if (normalizingStrategy[i] > 0):
-                AN_strategy[i] = AN_strategy[i] / normalizingStrategy[i]
-            else:
-                AN_strategy[i] = np.ones(AN_strategy.shape[0]) / self.actionNumbers
-            # self.rcmd_action[i] = self.getAction(AN_strategy[i])
-        self.strategySum = self.strategySum + AN_strategy
-# https://github.com/scipy/scipy/issues/10284
-        p = null_space(AN_strategy.T - np.eye(AN_strategy.shape[0]))
-        p = np.abs(p)
-        self.p = p / np.sum(p)
+        if (self.Q is None):
+            positive_regret = np.maximum(self.regretSum, 0)
+            norm = np.sum(positive_regret, axis = 1, keepdims = True)
+            self.Q = np.where(norm > 0, positive_regret / np.where(norm > 0, norm, 1), 1 / self.actionNumbers)
+            self.p = self.stationaryDistribution(self.Q, self.p).reshape(-1, 1)
+        self.strategySum = self.strategySum + self.Q
         return self.p
 
+    @staticmethod
+    def stationaryDistribution(Q, warm_start = None):
+        '''
+        Returns a stationary distribution p (p Q = p) of the row-stochastic matrix Q. Up to DIRECT_SOLVE_MAX_ACTIONS
+        actions, if it is not unique (i.e. the chain has several closed classes) or cannot be found, the uniform
+        distribution is returned. Above that, power iteration returns the distribution reached from warm_start (or
+        from the uniform one), which is one of the stationary distributions when they are not unique, and the last
+        iterate if it has not converged within POWER_ITERATION_MAX_STEPS steps.
+        '''
+        n = Q.shape[0]
+        if (n == 1):
+            return np.ones(1)
+        if (n == 2):
+            p = np.array([Q[1, 0], Q[0, 1]])
+        elif (n == 3):
+            # Markov chain tree theorem: p[i] is proportional to the sum of the weights of the trees directed to i
+            p = np.array([Q[1, 0] * Q[2, 0] + Q[1, 2] * Q[2, 0] + Q[2, 1] * Q[1, 0],
+                          Q[0, 1] * Q[2, 1] + Q[0, 2] * Q[2, 1] + Q[2, 0] * Q[0, 1],
+                          Q[0, 2] * Q[1, 2] + Q[0, 1] * Q[1, 2] + Q[1, 0] * Q[0, 2]])
+        elif (n <= InternalRM.DIRECT_SOLVE_MAX_ACTIONS):
+            # Replace one of the (linearly dependent) balance equations with the normalization constraint
+            A = Q.T - np.eye(n)
+            A[-1] = 1
+            b = np.zeros(n)
+            b[-1] = 1
+            try:
+                p = np.abs(np.linalg.solve(A, b))
+            except np.linalg.LinAlgError:
+                p = np.zeros(n)
+        else:
+            # Power iteration on the lazy chain (Q + I) / 2, which has the same stationary distributions but is
+            # aperiodic
+            p = warm_start.reshape(-1) if warm_start is not None and warm_start.size == n else np.ones(n) / n
+            lazy = (Q + np.eye(n)) / 2
+            for _ in range(InternalRM.POWER_ITERATION_MAX_STEPS):
+                next_p = p @ lazy
+                converged = np.sum(np.abs(next_p - p)) < InternalRM.POWER_ITERATION_TOLERANCE
+                p = next_p
+                if (converged):
+                    break
+
+        total = np.sum(p)
+        if (not np.isfinite(total) or total <= 0):
+            return np.ones(n) / n
+        return p / total
+
+    @staticmethod
+    def stationaryDistributions(Q, warm_start = None):
+        '''
+        Batched stationaryDistribution: returns the (m, n) stationary distributions of a stack of (m, n, n)
+        row-stochastic matrices, with the same closed forms and direct solve vectorized over the stack.
+        '''
+        (m, n, _) = Q.shape
+        if (n == 1):
+            return np.ones((m, 1))
+        if (n == 2):
+            p = np.stack([Q[:, 1, 0], Q[:, 0, 1]], axis = 1)
+        elif (n == 3):
+            p = np.stack([Q[:, 1, 0] * Q[:, 2, 0] + Q[:, 1, 2] * Q[:, 2, 0] + Q[:, 2, 1] * Q[:, 1, 0],
+                          Q[:, 0, 1] * Q[:, 2, 1] + Q[:, 0, 2] * Q[:, 2, 1] + Q[:, 2, 0] * Q[:, 0, 1],
+                          Q[:, 0, 2] * Q[:, 1, 2] + Q[:, 0, 1] * Q[:, 1, 2] + Q[:, 1, 0] * Q[:, 0, 2]], axis = 1)
+        elif (n <= InternalRM.DIRECT_SOLVE_MAX_ACTIONS):
+            A = np.swapaxes(Q, 1, 2) - np.eye(n)
+            A[:, -1] = 1
+            b = np.zeros((m, n, 1))
+            b[:, -1] = 1
+            try:
+                p = np.abs(np.linalg.solve(A, b)[:, :, 0])
+            except np.linalg.LinAlgError:
+                # Some matrix of the stack is singular: solve them one by one
+                return np.array([InternalRM.stationaryDistribution(Q[i]) for i in range(m)]).reshape(m, n)
+        else:
+            return np.array([InternalRM.stationaryDistribution(Q[i], None if warm_start is None else warm_start[i])
+                             for i in range(m)]).reshape(m, n)
+
+        total = np.sum(p, axis = 1, keepdims = True)
+        valid = np.isfinite(total) & (total > 0)
+        return np.where(valid, p / np.where(valid, total, 1), 1 / n)
+
 class ExternalRM(RegretMinimizer):
     def __init__(self, action_count):
         super().__init__(action_count)
@@ -106,3 +176,167 @@ class ExternalRM(RegretMinimizer):
         self.strategySum = self.strategySum + strategy
         return strategy
 
+
+class RegretMinimizerBank:
+    '''
+    Storage for all the regret minimizers used by ICFR on a tree, as rows of preallocated arrays addressed by integer
+    ids instead of one InternalRM / ExternalRM object each.
+    member:
+        internal_*: one internal minimizer per information set (the row is its dense index), with (A, A) regrets
+        external_*: the external minimizers, one per (trigger infoset, trigger action, infoset) triple, created by
+            externalId; their arrays grow by doubling
+    Strategies are recomputed for all the minimizers whose regrets changed in a single vectorized pass (when the first
+    of them is recommended) and observe updates all the minimizers of an iteration at once. The semantics are the ones
+    of InternalRM and ExternalRM, including the strategy sums accumulated at each recommendation.
+    '''
+    def __init__(self, action_counts, external_capacity = 64):
+        self.action_count = np.asarray(action_counts, dtype = np.int64).reshape(-1)
+        self.row_count = len(self.action_count)
+        self.max_action_count = int(self.action_count.max()) if self.row_count > 0 else 0
+        self.action_mask = np.arange(self.max_action_count)[None, :] < self.action_count[:, None]
+        A = self.max_action_count
+
+        self.internal_regret = np.zeros((self.row_count, A, A))
+        self.internal_strategy_sum = np.zeros((self.row_count, A, A))
+        self.internal_Q = np.zeros((self.row_count, A, A))
+        self.internal_p = np.zeros((self.row_count, A))
+        # A never recommended minimizer observes the utility of its last action, as recommended_action = -1 does
+        self.internal_action = self.action_count - 1
+        self.internal_stale = np.ones(self.row_count, dtype = bool)
+        self.internal_cdf = [None] * self.row_count
+        self.internal_groups = [(int(n), np.nonzero(self.action_count == n)[0]) for n in np.unique(self.action_count)]
+
+        self.external_ids = {}
+        self.external_count = 0
+        self.external_row = np.zeros(external_capacity, dtype = np.int64)
+        self.external_regret = np.zeros((external_capacity, A))
+        self.external_strategy_sum = np.zeros((external_capacity, A))
+        self.external_strategy = np.zeros((external_capacity, A))
+        self.external_action = np.zeros(external_capacity, dtype = np.int64)
+        self.external_stale = np.zeros(external_capacity, dtype = bool)
+        self.external_cdf = []
+
+        # Minimizers recommended since the last observe, whose strategy sums have not been accumulated yet
+        self.recommended_internal = []
+        self.recommended_external = []
+
+    def externalId(self, trigger_row, trigger_action, row):
+        '''
+        Returns the id of the external minimizer of the information set in the given row, for the given trigger
+        information set and action, creating it (with a uniform strategy) the first time it is requested.
+        '''
+        key = (trigger_row, trigger_action, row)
+        id = self.external_ids.get(key)
+        if (id is not None):
+            return id
+
+        id = self.external_count
+        if (id == len(self.external_row)):
+            self.growExternal()
+        n = int(self.action_count[row])
+        self.external_row[id] = row
+        self.external_strategy[id, :n] = 1 / n
+        self.external_action[id] = n - 1
+        self.external_cdf.append(sampling.buildCDF(self.external_strategy[id, :n]))
+        self.external_ids[key] = id
+        self.external_count += 1
+        return id
+
+    def growExternal(self):
+        capacity = 2 * len(self.external_row)
+        for name in ['external_row', 'external_regret', 'external_strategy_sum', 'external_strategy',
+                     'external_action', 'external_stale']:
+            old = getattr(self, name)
+            new = np.zeros((capacity,) + old.shape[1:], dtype = old.dtype)
+            new[:len(old)] = old
+            setattr(self, name, new)
+
+    def refreshStrategies(self):
+        '''
+        Recompute the strategies (and their CDFs) of all the minimizers whose regrets changed since the last refresh.
+        '''
+        for (n, rows) in self.internal_groups:
+            rows = rows[self.internal_stale[rows]]
+            if (len(rows) == 0):
+                continue
+            positive_regret = np.maximum(self.internal_regret[rows, :n, :n], 0)
+            norm = np.sum(positive_regret, axis = 2, keepdims = True)
+            Q = np.where(norm > 0, positive_regret / np.where(norm > 0, norm, 1), 1 / n)
+            p = InternalRM.stationaryDistributions(Q, self.internal_p[rows, :n])
+            self.internal_Q[rows, :n, :n] = Q
+            self.internal_p[rows, :n] = p
+            for (row, cdf) in zip(rows.tolist(), np.cumsum(p, axis = 1).tolist()):
+                self.internal_cdf[row] = cdf
+        self.internal_stale[:] = False
+
+        ids = np.nonzero(self.external_stale[:self.external_count])[0]
+        if (len(ids) > 0):
+            mask = self.action_mask[self.external_row[ids]]
+            strategy = np.maximum(self.external_regret[ids], 0)
+            norm = np.sum(strategy, axis = 1, keepdims = True)
+            uniform = mask / np.sum(mask, axis = 1, keepdims = True)
+            strategy = np.where(norm > 0, strategy / np.where(norm > 0, norm, 1), uniform)
+            self.external_strategy[ids] = strategy
+            for (id, cdf, n) in zip(ids.tolist(), np.cumsum(strategy, axis = 1).tolist(),
+                                    self.action_count[self.external_row[ids]].tolist()):
+                self.external_cdf[id] = cdf[:n]
+            self.external_stale[ids] = False
+
+    def recommendInternal(self, row):
+        '''
+        Returns the action recommended by the internal minimizer of the given row.
+        '''
+        if (self.internal_stale[row]):
+            self.refreshStrategies()
+        action = sampling.sampleFromCDF(self.internal_cdf[row])
+        self.internal_action[row] = action
+        self.recommended_internal.append(row)
+        return action
+
+    def recommendExternal(self, id):
+        '''
+        Returns the action recommended by the external minimizer with the given id.
+        '''
+        if (self.external_stale[id]):
+            self.refreshStrategies()
+        action = sampling.sampleFromCDF(self.external_cdf[id])
+        self.external_action[id] = action
+        self.recommended_external.append(id)
+        return action
+
+    def accumulateStrategies(self):
+        '''
+        Add the strategies of the minimizers recommended since the last call to their strategy sums.
+        '''
+        rows = np.array(self.recommended_internal, dtype = np.int64)
+        np.add.at(self.internal_strategy_sum, rows, self.internal_Q[rows])
+        ids = np.array(self.recommended_external, dtype = np.int64)
+        np.add.at(self.external_strategy_sum, ids, self.external_strategy[ids])
+        self.recommended_internal = []
+        self.recommended_external = []
+
+    def observe(self, internal_rows, external_ids, utilities):
+        '''
+        Make the given (distinct) internal and external minimizers observe the utilities of their information sets,
+        given as an (information sets, max_action_count) matrix.
+        '''
+        self.accumulateStrategies()
+        internal_rows = np.asarray(internal_rows, dtype = np.int64)
+        external_ids = np.asarray(external_ids, dtype = np.int64)
+
+        if (len(internal_rows) > 0):
+            u = utilities[internal_rows]
+            utility = self.internal_p[internal_rows][:, :, None] * u[:, None, :]
+            recommended = utility[np.arange(len(internal_rows)), :, self.internal_action[internal_rows]]
+            regret = self.internal_regret[internal_rows] + utility - recommended[:, :, None]
+            mask = self.action_mask[internal_rows]
+            self.internal_regret[internal_rows] = np.where(mask[:, :, None] & mask[:, None, :], regret, 0)
+            self.internal_stale[internal_rows] = True
+
+        if (len(external_ids) > 0):
+            rows = self.external_row[external_ids]
+            u = utilities[rows]
+            recommended = u[np.arange(len(external_ids)), self.external_action[external_ids]]
+            regret = self.external_regret[external_ids] + (u - recommended[:, None])
+            self.external_regret[external_ids] = np.where(self.action_mask[rows], regret, 0)
+            self.external_stale[external_ids] = True
@@ -0,0 +1,61 @@
+"""
+Sampling primitives shared by all the solvers.
+Actions are drawn from cumulative distributions (CDFs) by inverse transform sampling, using a single NumPy random
+Generator that can be seeded (see seed) to make runs reproducible.
+"""
+
+from bisect import bisect_right
+import numpy as np
+
+generator = np.random.default_rng()
+
+def seed(value = None):
+    """
+    Reset the random Generator used by all the samplers with the given seed.
+    """
+
+    global generator
+    generator = np.random.default_rng(value)
+
+def getGenerator():
+    """
+    Get the random Generator used by all the samplers.
+    """
+
+    return generator
+
+def random(size = None):
+    """
+    Draw uniform samples in [0, 1) (a float if size is not given, otherwise an array of the given shape).
+    """
+
+    return generator.random(size)
+
+def buildCDF(distribution):
+    """
+    Get the cumulative distribution (as a list) of the given probability distribution.
+    """
+
+    cdf = np.cumsum(np.asarray(distribution, dtype = float).reshape(-1))
+    return cdf.tolist()
+
+def sampleFromCDF(cdf):
+    """
+    Draw an action from a cumulative distribution (a list or a 1-D array), i.e. the first action a such that
+    r < cdf[a], where r is uniform in [0, 1). If the distribution sums to less than r (because of rounding errors),
+    the last action is drawn.
+    """
+
+    return min(bisect_right(cdf, generator.random()), len(cdf) - 1)
+
+def sampleRowsFromCDFs(cdfs, count, last_actions):
+    """
+    Draw count independent actions from each row of a padded (rows, width) matrix of cumulative distributions, where
+    the padding holds values greater or equal than 1 (e.g. the last cumulative value or inf) and last_actions is the
+    index of the last valid action of each row. Returns a (count, rows) matrix of actions.
+    """
+
+    r = generator.random((count, cdfs.shape[0]))
+    actions = (cdfs[None, :, :] <= r[:, :, None]).sum(axis = 2)
+    np.minimum(actions, last_actions, out = actions)
+    return actions
@@ -0,0 +1,157 @@
+import numpy as np
+
+class SupportingPlanSearch:
+    """
+    Decomposes the realization form of the marginal strategy of a player into a distribution over its action plans,
+    as CFRTree.buildJointFromMarginals does, over the flat representation of a CFRTree.
+    At each round the supporting plan of every leaf (the greedy max-min plan of CFRInformationSet.updateSupportingPlan,
+    forced to follow the sequence of the leaf) and its value (the minimum weight of the leaves it reaches) are computed
+    for all the leaves at once: a bottom-up pass over the information sets gives the greedy values, and a top-down
+    pass gives, for each information set, the minimum weight of the leaves reached outside of it when the plan leads
+    to it. The leaf with the best value is then chosen in the given order, exactly as the leaf-by-leaf search does.
+    """
+
+    def __init__(self, flat_tree):
+        """
+        Precompute the sequence structure of each player of the given FlatCFRTree.
+        """
+
+        self.flat_tree = flat_tree
+        flat = flat_tree
+
+        self.width = max(flat.max_action_count, 1)
+        # The empty sequence is mapped to the extra cell with index cell_count
+        self.cell_count = flat.infoset_count * self.width
+
+        # For each player, the parent cell of each leaf and the levels of its information sets (by increasing sequence
+        # length), each with the parent cells of its information sets
+        self.leaf_cells = []
+        self.levels = []
+        for p in range(flat.numOfPlayers):
+            leaf_cells = flat.player_sequence[p, flat.leaves].copy()
+            leaf_cells[leaf_cells < 0] = self.cell_count
+            self.leaf_cells.append(leaf_cells)
+
+            levels = []
+            for level in flat.sequence_levels:
+                infosets = level[flat.infoset_player[level] == p]
+                if(len(infosets) == 0):
+                    continue
+                parents = flat.infoset_parent_sequence[infosets].copy()
+                parents[parents < 0] = self.cell_count
+                levels.append((infosets, parents))
+            self.levels.append(levels)
+
+    def decompose(self, player, strategies, leaf_order, select_optimal_plan = True):
+        """
+        Returns a list of (plan, weight) pairs decomposing the realization form of the given padded matrix of
+        behavioural strategies for the given player, until every leaf has a weight of at most 0.001.
+        Leaves are tried in leaf_order (indices in the leaves of the flat tree): among the ones with the best value the
+        first is chosen, and if select_optimal_plan is False the first one with a positive value is chosen instead.
+        """
+
+        flat = self.flat_tree
+        leaf_cells = self.leaf_cells[player]
+        levels = self.levels[player]
+
+        # Realization form of the player: probability of its actions on the path to each leaf
+        probabilities = np.ones(flat.node_count)
+        e = flat.decision_edges
+        own = e[flat.edge_player[e] == player]
+        probabilities[own] = strategies[flat.edge_infoset[own], flat.incoming_action[own]]
+        reach = np.ones(flat.node_count)
+        for d in range(1, flat.max_depth + 1):
+            lo, hi = flat.levelRange(d)
+            reach[lo:hi] = reach[flat.parent[lo:hi]] * probabilities[lo:hi]
+        omega = reach[flat.leaves]
+
+        plan_distribution = []
+        while(True):
+            (values, greedy_actions, leaf_values) = self.leafValues(omega, leaf_cells, levels)
+
+            candidates = leaf_order[omega[leaf_order] != 0]
+            candidate_values = leaf_values[candidates]
+            best = None
+            if(select_optimal_plan):
+                if(len(candidates) > 0 and candidate_values.max() > 0):
+                    best = candidates[np.argmax(candidate_values)]
+            else:
+                positive = np.nonzero(candidate_values > 0)[0]
+                if(len(positive) > 0):
+                    best = candidates[positive[0]]
+
+            if(best is None):
+                for l in leaf_order:
+                    print((flat.nodes[flat.leaves[l]].id, flat.nodes[flat.leaves[l]].getSequence(player),
+                           omega[l]))
+                raise Exception("ERROR")
+
+            plan = np.full(flat.infoset_count, -1, dtype = np.int32)
+            for (infosets, _) in levels:
+                plan[infosets] = greedy_actions[infosets]
+            # Follow the sequence of the chosen leaf
+            cell = leaf_cells[best]
+            while(cell < self.cell_count):
+                plan[cell // self.width] = cell % self.width
+                cell = flat.infoset_parent_sequence[cell // self.width]
+                if(cell < 0):
+                    break
+
+            value = float(leaf_values[best])
+            omega[flat.plansOwnLeafReach(plan[None, :])[0, player]] -= value
+            plan_distribution.append((plan, value))
+
+            if(not np.any(omega > 0.001)):
+                return plan_distribution
+
+    def leafValues(self, omega, leaf_cells, levels):
+        """
+        Returns the greedy value and action of each information set of the player, and the value of the supporting
+        plan of each leaf, given the current weights of the leaves.
+        """
+
+        flat = self.flat_tree
+        cell_count = self.cell_count
+
+        # Minimum weight of the leaves directly below each cell
+        leaf_min = np.full(cell_count + 1, np.inf)
+        np.minimum.at(leaf_min, leaf_cells, omega)
+
+        # Bottom-up: greedy max-min value of each information set (starting from 1, as updateSupportingPlan does)
+        values = np.zeros(flat.infoset_count)
+        greedy_actions = np.full(flat.infoset_count, -1, dtype = np.int64)
+        cell_min = np.minimum(leaf_min, 1)
+        for (infosets, parents) in reversed(levels):
+            cells = cell_min[:cell_count].reshape(flat.infoset_count, self.width)[infosets]
+            cells = np.where(flat.action_mask[infosets], cells, -np.inf)
+            greedy_actions[infosets] = np.argmax(cells, axis = 1)
+            values[infosets] = cells[np.arange(len(infosets)), greedy_actions[infosets]]
+            np.minimum.at(cell_min, parents, values[infosets])
+
+        # Minimum value among the child information sets of each cell, and among the siblings of each of them
+        child_min = np.full(cell_count + 1, np.inf)
+        for (infosets, parents) in levels:
+            np.minimum.at(child_min, parents, values[infosets])
+        sibling_min = np.zeros(flat.infoset_count)
+        for (infosets, parents) in levels:
+            is_min = values[infosets] == child_min[parents]
+            min_count = np.bincount(parents, weights = is_min, minlength = cell_count + 1)
+            others_min = np.full(cell_count + 1, np.inf)
+            np.minimum.at(others_min, parents, np.where(is_min, np.inf, values[infosets]))
+            sibling_min[infosets] = np.where(is_min & (min_count[parents] == 1), others_min[parents],
+                                             child_min[parents])
+
+        # Top-down: minimum weight of the leaves reached outside of each information set when the plan leads to it
+        outside = np.full(flat.infoset_count, np.inf)
+        for (infosets, parents) in levels:
+            parent_infosets = np.minimum(parents // self.width, flat.infoset_count - 1)
+            parent_outside = np.where(parents < cell_count, outside[parent_infosets], np.inf)
+            outside[infosets] = np.minimum(np.minimum(parent_outside, leaf_min[parents]), sibling_min[infosets])
+
+        # Value of the supporting plan of each leaf: the leaves outside of the last information set of its sequence,
+        # the ones directly below its last cell and the greedy values of the child information sets of that cell
+        leaf_infosets = np.minimum(leaf_cells // self.width, flat.infoset_count - 1)
+        leaf_outside = np.where(leaf_cells < cell_count, outside[leaf_infosets], np.inf)
+        leaf_values = np.minimum(np.minimum(leaf_outside, leaf_min[leaf_cells]), child_min[leaf_cells])
+
+        return (values, greedy_actions, leaf_values)
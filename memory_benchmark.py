@@ -0,0 +1,69 @@
+from games.kuhn import build_kuhn_tree
+from games.leduc import build_leduc_tree
+from games.goofspiel import build_goofspiel_tree, TieSolver
+
+from data_structures.cfr_trees import CFRTree
+
+import gc
+import time
+import argparse
+import tracemalloc
+
+parser = argparse.ArgumentParser(description='memory benchmark of the CFR trees')
+
+parser.add_argument('game', type=str, help='type of game instance (kuhn, leduc, goofspiel)', choices=['kuhn','leduc','goofspiel'])
+
+parser.add_argument('--players', '-p', type=int, default=3, help='number of players')
+parser.add_argument('--rank', '-r', type=int, default=3, help='rank of the game')
+parser.add_argument('--suits', '-s', type=int, default=3, help='number of suits (only for leduc')
+parser.add_argument('--betting_parameters', '-bp', type=int, default=[2,4], nargs='*', help='betting parameters (only for leduc')
+
+args = parser.parse_args()
+
+def build_base_tree():
+    if args.game == 'kuhn':
+        return build_kuhn_tree(args.players, args.rank)
+    if args.game == 'leduc':
+        return build_leduc_tree(args.players, args.suits, args.rank, args.betting_parameters)
+    return build_goofspiel_tree(args.players, args.rank, TieSolver.Accumulate)
+
+def count_nodes(root):
+    count = 0
+    nodes = [ root ]
+    while(len(nodes) > 0):
+        node = nodes.pop()
+        count += 1
+        nodes.extend(node.children)
+    return count
+
+def allocated():
+    gc.collect()
+    return tracemalloc.get_traced_memory()[0]
+
+tracemalloc.start()
+start = allocated()
+
+start_time = time.time()
+base_tree = build_base_tree()
+base_bytes = allocated() - start
+base_time = time.time() - start_time
+
+start_time = time.time()
+cfr_tree = CFRTree(base_tree)
+both_bytes = allocated() - start
+cfr_time = time.time() - start_time
+
+node_count = count_nodes(cfr_tree.root)
+
+# Detach the CFR tree from the base tree, and free the latter
+cfr_tree.dropBaseTree()
+del base_tree
+cfr_bytes = allocated() - start
+
+tracemalloc.stop()
+
+print("Nodes: " + str(node_count) + ", information sets: " + str(len(cfr_tree.information_sets)))
+print("Base tree: {:.1f} bytes per node (built in {:.2f}s)".format(base_bytes / node_count, base_time))
+print("Base tree + CFR tree (before dropping the base tree): {:.1f} bytes per node (CFR tree built in {:.2f}s)"
+      .format(both_bytes / node_count, cfr_time))
+print("CFR tree (after dropping the base tree): {:.1f} bytes per node".format(cfr_bytes / node_count))
@@ -5,13 +5,15 @@ from games.hanabi import build_hanabi_tree, UtilitySplitter
 
 from data_structures.trees import randomTree
 from data_structures.cfr_trees import CFRTree
+from data_structures import sampling
 from cfr_code.sample_cfr import SolveWithSampleCFR
-from cfr_code.cfr import SolveWithCFR
+from cfr_code.cfr import SolveWithCFR, LINEAR_CFR_DISCOUNT, DCFR_DISCOUNT
 from cfr_code.reconstruction_cfr import SolveWithReconstructionCFR
 from cfr_code.icfr import SolveWithICFR
 from utilities.serialization import tree_to_colgen_dat_file
 
 import time
+import random
 import json
 import argparse
 from functools import reduce
@@ -40,11 +42,21 @@ parser.add_argument('--hanabi_utility_splitter', '-hus', type=str, default='unif
 parser.add_argument('--number_iterations', '-t', type=int, default=100000, help='number of iterations to run')
 parser.add_argument('--bootstrap_iterations', '-bt', type=int, default=0, help='number of iterations to run without sampling')
 parser.add_argument('--check_every_iteration', '-ct', type=int, default=10000, help='every how many iterations to check the epsilon')
-parser.add_argument('--bound_joint_size', '-bjs', const=True, nargs='?', help='bound or not the limit of the resulting joint strategy')
+parser.add_argument('--bound_joint_size', '-bjs', const=True, nargs='?', help='bound or not the limit of the resulting joint strategy (cfr-s and cfr-jr)')
+parser.add_argument('--batch_size', '-bs', type=int, default=1, help='number of action plans sampled at each cfr-s iteration (traversed in a batch over the flat tree when greater than 1)')
 parser.add_argument('--reconstruct_every_iteration', '-rei', type=int, default=1, help='every how many iterations to reconstruct a joint from the marginals')
 parser.add_argument('--reconstruct_not_optimal_plan', '-rnop', const=True, nargs='?', help='do not try to find the optimal plan to reconstruct at each reconstruction iteration')
 
-parser.add_argument('--algorithm', '-a', type=str, default='cfr', choices=['icfr', 'cfr-s', 'cfr', 'cfr+', 'cfr-jr'], help='algorithm to be used')
+parser.add_argument('--vectorized', '-vec', const=True, nargs='?', help='run cfr/cfr+/lcfr/dcfr with the vectorized engine over the flat tree')
+parser.add_argument('--alternating_updates', '-alt', const=True, nargs='?', help='traverse the tree once per player at each cfr iteration')
+parser.add_argument('--regret_pruning', '-rp', const=True, nargs='?', help='skip the subtrees below zero-probability actions of the opponents, accumulating the average strategy only on the full passes (cfr, cfr+, lcfr, dcfr and cfr-jr, not with --vectorized)')
+parser.add_argument('--full_pass_every_iteration', '-fpi', type=int, default=10, help='every how many iterations to run a full traversal when pruning')
+
+parser.add_argument('--dcfr_parameters', '-dcfr', type=float, default=list(DCFR_DISCOUNT), nargs=3, help='alpha, beta and gamma discounting parameters (only for dcfr)')
+
+parser.add_argument('--algorithm', '-a', type=str, default='cfr', choices=['icfr', 'cfr-s', 'cfr', 'cfr+', 'lcfr', 'dcfr', 'cfr-jr'], help='algorithm to be used')
+
+parser.add_argument('--seed', '-seed', type=int, default=None, help='seed of the random generators (for reproducible runs)')
 
 parser.add_argument('--logfile', '-log', type=str, default=(str(int(time.time())) + "log.log"), help='file in which to log events and errors')
 parser.add_argument('--results', '-res', type=str, default='results/', help='folder where to put the results (must contain subfolders for each game')
@@ -67,12 +79,20 @@ starting_clue_tokens = args.starting_clue_tokens
 color_distribution = args.color_distribution
 utility_splitter = {'uniform':UtilitySplitter.Uniform,'competitive':UtilitySplitter.Competitive}[args.hanabi_utility_splitter]
 
+if(args.seed != None):
+    random.seed(args.seed)
+    sampling.seed(args.seed)
+
 number_iterations = args.number_iterations
 bootstrap_iterations = args.bootstrap_iterations
 check_every_iteration = args.check_every_iteration
 bound_joint_size = args.bound_joint_size != None
 reconstructEveryIteration = args.reconstruct_every_iteration
 reconstructWithOptimalPlan = args.reconstruct_not_optimal_plan == None
+vectorized = args.vectorized != None
+alternating_updates = args.alternating_updates != None
+regret_pruning = args.regret_pruning != None
+full_pass_every_iteration = args.full_pass_every_iteration
 
 log_file_name = args.logfile
 results_directory = args.results
@@ -86,6 +106,10 @@ def log_line(string):
     log_file.close()
     print(string)
     
+if vectorized and regret_pruning:
+    log_line("ERROR: regret pruning is only supported by the recursive engine (drop --vectorized or --regret_pruning)")
+    exit()
+
 # if build_datfile and game != "random":
 #     log_line("ERROR: datfile are currently supported only for random games")
 #     exit()
@@ -106,14 +130,22 @@ def solve_function(cfr_tree, results_file_name):
     if args.algorithm == 'cfr-s':
         return SolveWithSampleCFR(cfr_tree, number_iterations, bootstrap_iterations = bootstrap_iterations,
                              checkEveryIteration = check_every_iteration, bound_joint_size = bound_joint_size,
-                             check_callback = log_result_point_callback(results_file_name))
-    if args.algorithm == 'cfr' or args.algorithm == 'cfr+':
+                             check_callback = log_result_point_callback(results_file_name), batch_size = args.batch_size)
+    if args.algorithm in ['cfr', 'cfr+', 'lcfr', 'dcfr']:
+        discount = {'lcfr': LINEAR_CFR_DISCOUNT, 'dcfr': tuple(args.dcfr_parameters)}.get(args.algorithm)
         return SolveWithCFR(cfr_tree, number_iterations, checkEveryIteration = check_every_iteration,
-                            check_callback = log_result_point_callback(results_file_name), use_cfr_plus = args.algorithm == 'cfr+')
+                            check_callback = log_result_point_callback(results_file_name), use_cfr_plus = args.algorithm == 'cfr+',
+                            vectorized = vectorized, alternating_updates = alternating_updates,
+                            regret_pruning = regret_pruning, full_pass_every_iteration = full_pass_every_iteration,
+                            discount = discount)
     if args.algorithm == 'cfr-jr':
         return SolveWithReconstructionCFR(cfr_tree, number_iterations, checkEveryIteration = check_every_iteration,
                                           reconstructEveryIteration = reconstructEveryIteration,
                                           reconstructWithOptimalPlan = reconstructWithOptimalPlan,
+                                          alternating_updates = alternating_updates,
+                                          regret_pruning = regret_pruning,
+                                          full_pass_every_iteration = full_pass_every_iteration,
+                                          bound_joint_size = bound_joint_size,
                                           check_callback = log_result_point_callback(results_file_name))
     if args.algorithm == 'icfr':
         return SolveWithICFR(cfr_tree, number_iterations, checkEveryIteration = check_every_iteration,
@@ -127,7 +159,7 @@ def count_sequences(cfr_tree):
     count = 0
 
     for p in range(cfr_tree.numOfPlayers):
-        Q_raw = list(filter(lambda q: q != {}, map(lambda n: n.base_node.getSequence(p), all_nodes)))
+        Q_raw = list(filter(lambda q: q != {}, map(lambda n: n.getSequence(p), all_nodes)))
         Q = [{}] + [dict(t) for t in {tuple(d.items()) for d in Q_raw}]
         count += len(Q)
         
@@ -191,6 +223,9 @@ if game == 'kuhn':
     kuhn_tree = build_kuhn_tree(num_players, rank)
     log_line("Built a " + game_name + " tree")
     cfr_tree = CFRTree(kuhn_tree)
+    # The base tree is not needed anymore: let it be freed
+    cfr_tree.dropBaseTree()
+    del kuhn_tree
     results_file_name = results_directory + "kuhn/" + str(int(time.time())) + "_" + str(num_players) + "_" + str(rank)
     results_file_name = make_filename_unique(results_file_name)
     
@@ -202,6 +237,9 @@ if game == 'leduc':
     leduc_tree = build_leduc_tree(num_players, num_of_suits, rank, betting_parameters)
     log_line("Built a " + game_name + " tree")
     cfr_tree = CFRTree(leduc_tree)
+    # The base tree is not needed anymore: let it be freed
+    cfr_tree.dropBaseTree()
+    del leduc_tree
 
     results_file_name = results_directory + "leduc/" + str(int(time.time())) + "_" + str(num_players) + "_" + str(num_of_suits) + "_" + str(rank)
     results_file_name = make_filename_unique(results_file_name)
@@ -214,6 +252,9 @@ if game == 'goofspiel':
     goofspiel_tree = build_goofspiel_tree(num_players, rank, tie_solver)
     log_line("Built a " + game_name + " tree")
     cfr_tree = CFRTree(goofspiel_tree)
+    # The base tree is not needed anymore: let it be freed
+    cfr_tree.dropBaseTree()
+    del goofspiel_tree
 
     results_file_name = results_directory + "goofspiel/" + str(int(time.time())) + \
                         "_" + str(num_players) + "_" + str(rank) + '_' + tie_solver.name
@@ -238,6 +279,10 @@ if game == 'random':
             f.write(tree_to_colgen_dat_file(random_tree))
         log_line("Dat file created (for random tree).")
 
+    # The base tree is not needed anymore: let it be freed
+    cfr_tree.dropBaseTree()
+    del random_tree
+
     run_experiment(cfr_tree, results_file_name, parameters_dict, args, number_iterations)
 
 if game == 'hanabi':
@@ -250,6 +295,9 @@ if game == 'hanabi':
                                     cards_per_player, starting_clue_tokens, utility_splitter = utility_splitter)
     log_line("Built a " + game_name + " tree")
     cfr_tree = CFRTree(hanabi_tree)
+    # The base tree is not needed anymore: let it be freed
+    cfr_tree.dropBaseTree()
+    del hanabi_tree
 
     results_file_name = results_directory + "hanabi/" + str(int(time.time())) + "_" + string_description
     results_file_name = make_filename_unique(results_file_name)
@@ -0,0 +1,42 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from games.kuhn import build_kuhn_tree
+from games.leduc import build_leduc_tree
+from data_structures.cfr_trees import CFRTree
+from data_structures import sampling
+from cfr_code.cfr import CFRIteration
+
+# Small instances of the games on which the flat paths are compared with the recursive ones
+GAMES = {
+    'kuhn': lambda: build_kuhn_tree(3, 3),
+    'leduc': lambda: build_leduc_tree(2, 3, 3, [2, 4]),
+}
+
+@pytest.fixture(autouse = True)
+def seeded_sampling():
+    sampling.seed(0)
+
+@pytest.fixture(params = sorted(GAMES))
+def build_tree(request):
+    """
+    Factory of fresh CFRTrees of each game.
+    """
+
+    return lambda: CFRTree(GAMES[request.param]())
+
+@pytest.fixture
+def cfr_tree(build_tree):
+    """
+    A CFRTree of each game, after a few CFR iterations (so that current and average strategies are not uniform).
+    """
+
+    tree = build_tree()
+    for _ in range(5):
+        CFRIteration(tree)
+        tree.updateCurrentStrategies()
+    return tree
@@ -0,0 +1,21 @@
+"""
+Reference computations shared by the tests, written directly on the recursive CFRTree.
+"""
+
+from data_structures import sampling
+from data_structures.cfr_trees import ACTION_PLAN_DTYPE
+
+def sampledPlans(tree, count):
+    """
+    Sample count joint action plans from the current strategies of the given tree, as a (count, infosets) matrix.
+    """
+
+    table = tree.infoset_table
+    return sampling.sampleRowsFromCDFs(table.strategy_cdf, count, table.last_action).astype(ACTION_PLAN_DTYPE)
+
+def followsSequence(tree, plan, sequence):
+    """
+    Whether the given action plan plays every (infoset id, action) pair of the given sequence.
+    """
+
+    return all(plan[tree.information_sets[id].index] == a for (id, a) in sequence.items())
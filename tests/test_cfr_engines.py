@@ -0,0 +1,115 @@
+import numpy as np
+import pytest
+
+from cfr_code.cfr import CFRIteration
+from cfr_code.vectorized_cfr import VectorizedCFR
+from cfr_code.batched_sample_cfr import BatchedSampleCFR
+from cfr_code.sample_cfr import sampleCFR
+from data_structures.cfr_trees import CFRChanceNode
+
+def assertSameTables(table, expected):
+    assert np.allclose(table.cumulative_regret, expected.cumulative_regret)
+    assert np.allclose(table.cumulative_strategy, expected.cumulative_strategy)
+    assert np.allclose(table.current_strategy, expected.current_strategy)
+
+def nodeVisits(tree):
+    return np.array([node.visits for node in tree.getFlatTree().nodes])
+
+@pytest.mark.parametrize('use_cfr_plus', [False, True])
+def test_vectorized_cfr_matches_recursive(build_tree, use_cfr_plus):
+    (tree, reference) = (build_tree(), build_tree())
+    engine = VectorizedCFR(tree, use_cfr_plus)
+
+    for _ in range(20):
+        engine.iteration()
+        tree.updateCurrentStrategies()
+        CFRIteration(reference, use_cfr_plus)
+        reference.updateCurrentStrategies()
+    engine.writeBack()
+
+    assertSameTables(tree.infoset_table, reference.infoset_table)
+    assert np.allclose(nodeVisits(tree), nodeVisits(reference))
+
+@pytest.mark.parametrize('alternating_updates', [False, True])
+def test_pruned_iterations_keep_the_regrets(build_tree, alternating_updates):
+    (tree, reference) = (build_tree(), build_tree())
+
+    for _ in range(20):
+        CFRIteration(tree, alternating_updates = alternating_updates, prune = True)
+        tree.updateCurrentStrategies()
+        CFRIteration(reference, alternating_updates = alternating_updates)
+        reference.updateCurrentStrategies()
+
+    assert np.allclose(tree.infoset_table.cumulative_regret, reference.infoset_table.cumulative_regret)
+    assert np.all(tree.infoset_table.cumulative_strategy == 0)
+
+def replaySampleCFR(tree, plans, outcomes, monkeypatch):
+    """
+    Run sampleCFR on the given tree for each of the given plans and each player, with chance playing the given
+    (plans, players, chance nodes) outcomes of BatchedSampleCFR.
+    """
+
+    flat = tree.getFlatTree()
+    chance_nodes = [flat.nodes[c] for c in flat.chance_nodes]
+    outcome = {}
+    monkeypatch.setattr(CFRChanceNode, 'sampleAction', lambda node: outcome[node])
+
+    rows = tree.infoset_table.rowLists()
+    for (plan, plan_outcomes) in zip(plans.tolist(), outcomes):
+        for p in range(tree.numOfPlayers):
+            outcome = dict(zip(chance_nodes, plan_outcomes[p].tolist()))
+            sampleCFR(tree.root, p, [1] * tree.numOfPlayers, plan, rows)
+    tree.infoset_table.storeRowLists(rows)
+
+def recordSamples(engine):
+    """
+    Make the engine record the plans and chance outcomes it samples, in a list of (plans, outcomes) pairs.
+    """
+
+    samples = []
+    (samplePlans, sampleChanceOutcomes) = (engine.samplePlans, engine.sampleChanceOutcomes)
+
+    def recordPlans():
+        samples.append([samplePlans(), None])
+        return samples[-1][0]
+
+    def recordChanceOutcomes(count):
+        outcomes = sampleChanceOutcomes(count)
+        samples[-1][1] = outcomes.reshape(engine.batch_size, engine.flat_tree.numOfPlayers, -1)
+        return outcomes
+
+    engine.samplePlans = recordPlans
+    engine.sampleChanceOutcomes = recordChanceOutcomes
+    return samples
+
+def test_batched_sample_cfr_matches_sample_cfr(build_tree, monkeypatch):
+    (tree, reference) = (build_tree(), build_tree())
+    engine = BatchedSampleCFR(tree, 1)
+    samples = recordSamples(engine)
+
+    for _ in range(30):
+        engine.iteration()
+        tree.updateCurrentStrategies()
+        (plans, outcomes) = samples[-1]
+        replaySampleCFR(reference, plans, outcomes, monkeypatch)
+        reference.updateCurrentStrategies()
+    engine.writeBack()
+
+    assertSameTables(tree.infoset_table, reference.infoset_table)
+    assert np.allclose(nodeVisits(tree), nodeVisits(reference))
+
+def test_batched_sample_cfr_averages_the_batch(build_tree, monkeypatch):
+    (tree, reference) = (build_tree(), build_tree())
+    batch_size = 4
+    engine = BatchedSampleCFR(tree, batch_size)
+    samples = recordSamples(engine)
+
+    engine.iteration()
+    engine.writeBack()
+    (plans, outcomes) = samples[-1]
+    replaySampleCFR(reference, plans, outcomes, monkeypatch)
+
+    # The strategy updates do not depend on the regrets, so the ones of the batch add up
+    assert np.allclose(tree.infoset_table.cumulative_strategy,
+                       reference.infoset_table.cumulative_strategy / batch_size)
+    assert np.allclose(nodeVisits(tree), nodeVisits(reference) / batch_size)
@@ -0,0 +1,60 @@
+import numpy as np
+import pytest
+
+from data_structures.cfr_trees import CFRJointStrategy
+
+from helpers import sampledPlans
+
+def test_leaf_weights_match_plan_by_plan_evaluation(cfr_tree):
+    # The joint strategy bound to the tree is evaluated on its leaf weights, the other one plan by plan
+    joint = CFRJointStrategy(-1, cfr_tree)
+    reference = CFRJointStrategy()
+    plans = cfr_tree.getFlatTree().reducePlans(sampledPlans(cfr_tree, 40))
+    for (k, plan) in enumerate(plans):
+        joint.addActionPlan(plan, 1 + k % 3)
+        reference.addActionPlan(plan, 1 + k % 3)
+    factored = cfr_tree.buildFactoredJointFromMarginals()
+    joint.addFactoredDistribution(factored)
+    reference.addJointDistribution(CFRJointStrategy.productPlans(factored))
+
+    assert np.isclose(joint.frequencyCount, reference.frequencyCount)
+    assert joint.supportSize() == len(reference.plans)
+    assert np.allclose(cfr_tree.getUtility(joint), cfr_tree.getUtility(reference))
+    assert np.allclose(cfr_tree.checkEquilibrium(joint), cfr_tree.checkEquilibrium(reference))
+
+def test_marginals_epsilon_matches_joint_of_the_marginals(cfr_tree):
+    # The product of the decompositions of the average strategies is the product of the marginals
+    flat = cfr_tree.getFlatTree()
+    table = cfr_tree.infoset_table
+    table.current_strategy[:] = flat.gatherStrategies(lambda i: i.getAverageStrategy())
+    table.refreshStrategyCDF()
+    joint = CFRJointStrategy(-1, cfr_tree)
+    joint.addFactoredDistribution(cfr_tree.buildFactoredJointFromMarginals())
+
+    assert np.allclose(cfr_tree.checkMarginalsEpsilon(), cfr_tree.checkEquilibrium(joint), atol = 0.01)
+
+@pytest.mark.parametrize('leaf_scale_limit', [CFRJointStrategy.leaf_scale_limit, 1.01])
+def test_bounded_joint_preserves_the_mass(build_tree, monkeypatch, leaf_scale_limit):
+    monkeypatch.setattr(CFRJointStrategy, 'leaf_scale_limit', leaf_scale_limit)
+    # Plans sampled from the uniform strategies, so that many of them are distinct
+    cfr_tree = build_tree()
+    joint = CFRJointStrategy(10, cfr_tree)
+    plans = cfr_tree.getFlatTree().reducePlans(sampledPlans(cfr_tree, 200))
+    weights = np.random.default_rng(0).random(len(plans))
+    for (plan, weight) in zip(plans, weights):
+        joint.addActionPlan(plan, weight)
+        # Check the leaf weights along the way, as they are folded lazily
+        if(len(joint.pending_plans) == 7):
+            joint.getLeafWeights()
+
+    assert joint.evictions > 0
+    assert len(joint.plans) == 10
+    assert np.isclose(joint.frequencyCount, weights.sum())
+    assert np.isclose(sum(joint.plans.values()), joint.frequencyCount)
+
+    # The leaf weights are the ones of the kept plans, with their rescaled weights
+    kept = CFRJointStrategy(-1, cfr_tree)
+    for (key, weight) in joint.plans.items():
+        kept.addActionPlan(CFRJointStrategy.keyToActionPlan(key), weight)
+    assert np.allclose(joint.getLeafWeights(), kept.getLeafWeights())
+    assert np.allclose(cfr_tree.getUtility(joint), cfr_tree.getUtility(kept))
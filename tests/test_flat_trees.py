@@ -0,0 +1,39 @@
+import numpy as np
+
+from helpers import sampledPlans, followsSequence
+
+def test_expected_utility_matches_recursive(cfr_tree):
+    flat = cfr_tree.getFlatTree()
+    strategies = flat.gatherStrategies(lambda i: i.getAverageStrategy())
+
+    assert np.allclose(flat.getExpectedUtility(strategies), cfr_tree.root.getExpectedUtility())
+
+def test_plans_leaf_reach_matches_sequences(cfr_tree):
+    flat = cfr_tree.getFlatTree()
+    n = flat.numOfPlayers
+    plans = sampledPlans(cfr_tree, 8)
+
+    reach = flat.plansLeafReach(plans)
+    own_reach = flat.plansOwnLeafReach(plans)
+
+    for (l, leaf) in enumerate(flat.leaves):
+        sequences = [flat.nodes[leaf].getSequence(p) for p in range(n)]
+        for (k, plan) in enumerate(plans):
+            follows = [followsSequence(cfr_tree, plan, sequences[p]) for p in range(n)]
+            for p in range(n):
+                assert reach[k, p, l] == all(follows[:p] + follows[p + 1:])
+                assert own_reach[k, p, l] == follows[p]
+            assert reach[k, n, l] == all(follows)
+
+def test_reduce_plans_matches_sequences(cfr_tree):
+    flat = cfr_tree.getFlatTree()
+    plans = sampledPlans(cfr_tree, 8)
+
+    reduced = flat.reducePlans(plans)
+
+    for (k, plan) in enumerate(plans):
+        for iset in cfr_tree.information_sets.values():
+            expected = plan[iset.index] if followsSequence(cfr_tree, plan, iset.sequence) else -1
+            assert reduced[k, iset.index] == expected
+    # A single plan is reduced as a row of the matrix
+    assert np.array_equal(flat.reducePlans(plans[0]), reduced[0])
@@ -0,0 +1,89 @@
+import numpy as np
+
+from games.kuhn import build_kuhn_tree
+from data_structures.cfr_trees import CFRTree, CFRJointStrategy
+from cfr_code import icfr
+
+from helpers import followsSequence
+
+def runICFR(tree, iterations):
+    """
+    Run the iterations of SolveWithICFR, storing the sampled plans in the tree.
+    """
+
+    plan = tree.emptyActionPlan()
+    for _ in range(iterations):
+        icfr.init(tree)
+        plan.fill(-1)
+        icfr.ICFR_sampling(tree.root, plan)
+        icfr.get_utility(tree, plan)
+        key = CFRJointStrategy.actionPlanToKey(plan)
+        if(key in tree.actionPlan):
+            tree.actionPlan[key][0] += 1
+        else:
+            tree.actionPlan[key] = [1, 0]
+        icfr.ICFR_Update(tree)
+
+def baselineGain(tree, node, t, a):
+    """
+    Returns the function giving the deviated minus the recommended utility of action a at the given node, for given
+    weights of the plans of the tree, as computed by the original getExpectedDeviatedUtility and getLatter.
+    """
+
+    iset = node.information_set
+    p = iset.player
+    n = tree.numOfPlayers
+    root_children = len(tree.root.children)
+    plans = [(CFRJointStrategy.keyToActionPlan(key), count) for (key, (count, _)) in tree.actionPlan.items()]
+
+    # For each leaf below the information set, u * mu1 and whether each plan is counted in mu2
+    deviated_terms = []
+    for leaf in set().union(*[iset.getTerminals(b) for b in range(iset.action_count)]):
+        sequences = [leaf.getSequence(q) for q in range(n)]
+        mu1 = 0
+        for (plan, count) in plans:
+            others_follow = all(followsSequence(tree, plan, sequences[q]) for q in range(n) if q != p)
+            if(plan[iset.index] == a and followsSequence(tree, plan, iset.sequence) and others_follow):
+                mu1 += count / t
+        in_mu2 = np.array([followsSequence(tree, plan, sequences[p]) for (plan, _) in plans])
+        deviated_terms.append((leaf.utility[p] * mu1 / root_children, in_mu2))
+
+    latter = 0
+    for leaf in iset.getTerminals(a):
+        sequences = [leaf.getSequence(q) for q in range(n)]
+        mu = sum(count / t for (plan, count) in plans
+                 if all(followsSequence(tree, plan, sequences[q]) for q in range(n)))
+        latter += leaf.utility[p] * mu / root_children
+
+    return lambda weights: sum(term * weights[in_mu2].sum() for (term, in_mu2) in deviated_terms) - latter
+
+def test_epsilons_maximize_the_baseline_deviations():
+    tree = CFRTree(build_kuhn_tree(3, 3))
+    t = 40
+    runICFR(tree, t)
+    plan_count = len(tree.actionPlan)
+    # Deviating to no plan, to each single plan, and to a few random weightings as the original getEpsilon did
+    candidates = [np.zeros(plan_count)] + list(np.eye(plan_count))
+    rng = np.random.default_rng(0)
+    random_weights = []
+    for _ in range(5):
+        r = rng.random(plan_count + 1)
+        random_weights.append(r[1:] / r.sum())
+
+    epsilons = icfr.getEpsilon(tree, tree.root, t)
+
+    nodes = tree.icfr_epsilon_evaluator.evaluatedNodes(tree.root)
+    assert sorted(epsilons) == sorted(set(node.information_set.id for node in nodes))
+    for node in nodes:
+        gains = [baselineGain(tree, node, t, a) for a in range(node.information_set.action_count)]
+        best = max(gain(w) for gain in gains for w in candidates)
+        assert np.isclose(epsilons[node.information_set.id], max(best, -1))
+        for gain in gains:
+            for w in random_weights:
+                assert gain(w) <= epsilons[node.information_set.id] + 1e-12
+
+    # The stored weights are the deviation reaching the epsilon of the last node
+    last = nodes[-1]
+    weights = np.array([w for (_, w) in tree.actionPlan.values()])
+    gain = max(baselineGain(tree, last, t, a)(weights) for a in range(last.information_set.action_count))
+    assert np.isclose(max(gain, -1), epsilons[last.information_set.id])
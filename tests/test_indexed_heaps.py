@@ -0,0 +1,51 @@
+import numpy as np
+
+from data_structures.indexed_heaps import IndexedMinHeap
+
+def test_matches_sorted_priorities():
+    rng = np.random.default_rng(0)
+    heap = IndexedMinHeap()
+    reference = {}
+
+    for step in range(2000):
+        operation = rng.integers(5)
+        if(operation <= 1 or len(reference) == 0):
+            item = int(rng.integers(200))
+            if(item in reference):
+                continue
+            priority = (int(rng.integers(50)), step)
+            heap.push(item, priority)
+            reference[item] = priority
+        elif(operation == 2):
+            item = list(reference)[rng.integers(len(reference))]
+            priority = (int(rng.integers(50)), reference[item][1])
+            heap.update(item, priority)
+            reference[item] = priority
+        elif(operation == 3):
+            item = list(reference)[rng.integers(len(reference))]
+            heap.remove(item)
+            del reference[item]
+        else:
+            (item, priority) = heap.pop()
+            assert priority == min(reference.values())
+            assert reference.pop(item) == priority
+
+        assert len(heap) == len(reference)
+        if(len(reference) > 0):
+            assert heap.peek()[1] == min(reference.values())
+
+    for item in reference:
+        assert item in heap
+        assert heap.priority(item) == reference[item]
+    popped = [heap.pop()[1] for _ in range(len(reference))]
+    assert popped == sorted(reference.values())
+
+def test_map_priorities_keeps_the_order():
+    heap = IndexedMinHeap()
+    for (item, weight) in enumerate([5, 1, 4, 1, 3]):
+        heap.push(item, (weight, item))
+
+    heap.mapPriorities(lambda priority: (priority[0] * 2.5, priority[1]))
+
+    assert heap.priority(2) == (10, 2)
+    assert [heap.pop() for _ in range(5)] == [(1, (2.5, 1)), (3, (2.5, 3)), (4, (7.5, 4)), (2, (10, 2)), (0, (12.5, 0))]
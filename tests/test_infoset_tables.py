@@ -0,0 +1,57 @@
+import numpy as np
+
+def test_update_current_strategies_matches_per_infoset(cfr_tree):
+    table = cfr_tree.infoset_table
+    table.cumulative_regret[:] = np.random.default_rng(0).normal(size = table.cumulative_regret.shape)
+    # An information set with no positive regret gets the uniform strategy
+    table.cumulative_regret[0] = -1
+
+    expected = table.current_strategy.copy()
+    for iset in cfr_tree.information_sets.values():
+        iset.updateCurrentStrategy()
+        expected[iset.table_row, :iset.action_count] = iset.current_strategy
+    expected_cdf = table.strategy_cdf.copy()
+
+    table.current_strategy[:] = 0
+    table.updateCurrentStrategies()
+
+    assert np.allclose(table.current_strategy, expected)
+    assert np.allclose(table.strategy_cdf, expected_cdf)
+    assert np.allclose(table.current_strategy[0, :table.action_count[0]], 1 / table.action_count[0])
+
+def test_information_sets_are_views_on_the_table(cfr_tree):
+    table = cfr_tree.infoset_table
+
+    for iset in cfr_tree.information_sets.values():
+        iset.cumulative_regret[-1] = iset.table_row
+        assert table.cumulative_regret[iset.table_row, iset.action_count - 1] == iset.table_row
+
+def test_row_lists_round_trip(cfr_tree):
+    table = cfr_tree.infoset_table
+    regret = table.cumulative_regret.copy()
+    strategy = table.cumulative_strategy.copy()
+
+    rows = table.rowLists()
+    for (r, (row_regret, row_strategy, _)) in enumerate(rows):
+        row_regret[0] += r
+        row_strategy[0] -= r
+    table.storeRowLists(rows)
+
+    regret[:, 0] += np.arange(table.infoset_count)
+    strategy[:, 0] -= np.arange(table.infoset_count)
+    assert np.array_equal(table.cumulative_regret, regret)
+    assert np.array_equal(table.cumulative_strategy, strategy)
+
+def test_discount_matches_dcfr_weights(cfr_tree):
+    table = cfr_tree.infoset_table
+    regret = table.cumulative_regret.copy()
+    strategy = table.cumulative_strategy.copy()
+    (t, alpha, beta, gamma) = (3, 1.5, 0, 2)
+
+    table.discount(t, alpha, beta, gamma)
+
+    for (r, row) in enumerate(regret):
+        for (a, value) in enumerate(row):
+            weight = t ** alpha / (t ** alpha + 1) if value > 0 else t ** beta / (t ** beta + 1)
+            assert np.isclose(table.cumulative_regret[r, a], value * weight)
+    assert np.allclose(table.cumulative_strategy, strategy * (t / (t + 1)) ** gamma)
@@ -0,0 +1,78 @@
+import numpy as np
+
+from data_structures import sampling
+from data_structures.regret_minimizers import InternalRM, ExternalRM, RegretMinimizerBank
+
+def runMinimizers(action_counts, triples, utilities, recommendInternal, recommendExternal, observe):
+    """
+    Recommend an action from every internal minimizer and from the external one of every (trigger row, trigger action,
+    row) triple, then make them observe the utilities, for each (rows, max_action_count) utility matrix given.
+    Returns the recommended actions.
+    """
+
+    actions = []
+    for u in utilities:
+        actions.append([recommendInternal(row) for row in range(len(action_counts))] +
+                       [recommendExternal(triple) for triple in triples])
+        observe(u)
+    return actions
+
+def test_bank_matches_minimizer_objects(cfr_tree):
+    action_counts = cfr_tree.infoset_table.action_count.tolist()
+    rng = np.random.default_rng(0)
+    rows = len(action_counts)
+    triples = [(int(t), int(rng.integers(action_counts[t])), int(r))
+               for (t, r) in rng.integers(rows, size = (20, 2))]
+    triples = list(dict.fromkeys(triples))
+    utilities = rng.normal(size = (30, rows, max(action_counts)))
+
+    # Reference: one object per minimizer
+    internal = [InternalRM(n) for n in action_counts]
+    external = {triple: ExternalRM(action_counts[triple[2]]) for triple in triples}
+
+    def observeObjects(u):
+        for (row, rm) in enumerate(internal):
+            rm.observe(u[row, :action_counts[row]])
+        for (triple, rm) in external.items():
+            rm.observe(u[triple[2], :action_counts[triple[2]]])
+
+    sampling.seed(3)
+    expected = runMinimizers(action_counts, triples, utilities, lambda row: internal[row].recommend(),
+                             lambda triple: external[triple].recommend(), observeObjects)
+
+    # Bank, with a small initial capacity so that the external arrays grow
+    bank = RegretMinimizerBank(action_counts, external_capacity = 2)
+    ids = [bank.externalId(*triple) for triple in triples]
+    assert [bank.externalId(*triple) for triple in triples] == ids
+
+    sampling.seed(3)
+    found = runMinimizers(action_counts, triples, utilities, bank.recommendInternal,
+                          lambda triple: bank.recommendExternal(bank.externalId(*triple)),
+                          lambda u: bank.observe(np.arange(rows), ids, u))
+    bank.accumulateStrategies()
+
+    assert found == expected
+    for (row, rm) in enumerate(internal):
+        n = action_counts[row]
+        assert np.allclose(bank.internal_regret[row, :n, :n], rm.regretSum)
+        assert np.allclose(bank.internal_strategy_sum[row, :n, :n], rm.strategySum)
+    for (triple, id) in zip(triples, ids):
+        n = action_counts[triple[2]]
+        assert np.allclose(bank.external_regret[id, :n], external[triple].regretSum)
+        assert np.allclose(bank.external_strategy_sum[id, :n], external[triple].strategySum)
+
+def test_stationary_distributions_match_one_by_one():
+    rng = np.random.default_rng(0)
+
+    for n in [1, 2, 3, 5, InternalRM.DIRECT_SOLVE_MAX_ACTIONS + 2]:
+        Q = rng.random((6, n, n))
+        Q[0] = np.eye(n) # Several closed classes
+        Q /= Q.sum(axis = 2, keepdims = True)
+
+        p = InternalRM.stationaryDistributions(Q)
+
+        for i in range(len(Q)):
+            assert np.allclose(p[i], InternalRM.stationaryDistribution(Q[i]))
+            assert np.isclose(p[i].sum(), 1)
+        # Stationary wherever the distribution is unique
+        assert np.allclose(np.einsum('mi,mij->mj', p[1:], Q[1:]), p[1:], atol = 1e-9)
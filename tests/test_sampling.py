@@ -0,0 +1,46 @@
+from bisect import bisect_right
+
+import numpy as np
+
+from data_structures import sampling
+
+def test_seed_makes_draws_reproducible():
+    sampling.seed(42)
+    first = (sampling.random(5), sampling.sampleFromCDF([0.2, 0.5, 1]))
+    sampling.seed(42)
+    second = (sampling.random(5), sampling.sampleFromCDF([0.2, 0.5, 1]))
+
+    assert np.array_equal(first[0], second[0])
+    assert first[1] == second[1]
+
+def test_sample_from_cdf_follows_the_distribution():
+    distribution = [0.1, 0, 0.6, 0.3]
+    cdf = sampling.buildCDF(distribution)
+
+    counts = np.bincount([sampling.sampleFromCDF(cdf) for _ in range(20000)], minlength = 4)
+
+    assert counts[1] == 0
+    assert np.allclose(counts / counts.sum(), distribution, atol = 0.02)
+
+def test_sample_rows_matches_sample_from_cdf(cfr_tree):
+    table = cfr_tree.infoset_table
+    count = 50
+
+    sampling.seed(1)
+    r = sampling.random((count, table.infoset_count))
+    sampling.seed(1)
+    actions = sampling.sampleRowsFromCDFs(table.strategy_cdf, count, table.last_action)
+
+    for (row, n) in enumerate(table.action_count):
+        cdf = np.cumsum(table.current_strategy[row, :n]).tolist()
+        for k in range(count):
+            assert actions[k, row] == min(bisect_right(cdf, r[k, row]), n - 1)
+
+def test_sample_rows_never_draws_the_padding():
+    # Rows summing to less than 1 because of rounding errors, padded with their last cumulative value
+    cdfs = np.array([[0.5, 0.999, 0.999], [0.3, 0.6, 0.9999]])
+    last_actions = np.array([1, 2])
+
+    actions = sampling.sampleRowsFromCDFs(cdfs, 5000, last_actions)
+
+    assert np.all(actions <= last_actions)
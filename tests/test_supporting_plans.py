@@ -0,0 +1,58 @@
+import numpy as np
+
+def referenceDecomposition(tree, player, leaves, select_optimal_plan):
+    """
+    Leaf-by-leaf decomposition of the realization form of the current strategy of player, as the original
+    CFRTree.buildJointFromMarginals did.
+    """
+
+    tree.root.buildRealizationForm(player, 1)
+    plan_distribution = []
+
+    while(True):
+        best_plan = None
+        best_plan_value = 0
+        for l in leaves:
+            if(l.omega == 0):
+                continue
+            (plan, value) = tree.builSupportingPlan(l, player)
+            if(value > best_plan_value):
+                (best_plan, best_plan_value) = (plan, value)
+                if(not select_optimal_plan):
+                    break
+
+        for t in tree.root.terminalsUnderPlan(player, best_plan):
+            t.omega -= best_plan_value
+        plan_distribution.append((best_plan, best_plan_value))
+
+        if(all(l.omega <= 0.001 for l in leaves)):
+            return plan_distribution
+
+def test_decompose_matches_leaf_by_leaf_search(cfr_tree):
+    flat = cfr_tree.getFlatTree()
+    search = cfr_tree.getSupportingPlanSearch()
+    leaves = [flat.nodes[l] for l in flat.leaves]
+    leaf_order = np.arange(flat.leaf_count)
+
+    for select_optimal_plan in [True, False]:
+        for p in range(cfr_tree.numOfPlayers):
+            expected = referenceDecomposition(cfr_tree, p, leaves, select_optimal_plan)
+            found = search.decompose(p, cfr_tree.infoset_table.current_strategy, leaf_order, select_optimal_plan)
+
+            assert len(found) == len(expected)
+            for ((plan, weight), (expected_plan, expected_weight)) in zip(found, expected):
+                assert np.isclose(weight, expected_weight)
+                assert np.array_equal(flat.reducePlans(plan), flat.reducePlans(expected_plan))
+
+def test_decomposition_reproduces_the_realization_form(cfr_tree):
+    flat = cfr_tree.getFlatTree()
+    strategies = cfr_tree.infoset_table.current_strategy
+    reach = flat.reachProbabilities(flat.edgeProbabilities(strategies))[:, flat.leaves]
+
+    for (p, (plans, weights)) in enumerate(cfr_tree.buildFactoredJointFromMarginals()):
+        # Plans only set the information sets of their player
+        assert np.all(plans[:, flat.infoset_player != p] == -1)
+        own_weight = weights @ flat.plansOwnLeafReach(plans)[:, p]
+        # Every leaf is left with a weight of at most 0.001
+        assert np.all(own_weight <= reach[p] + 1e-9)
+        assert np.all(reach[p] - own_weight <= 0.001 + 1e-9)
@@ -48,7 +48,7 @@ def tree_to_colgen_dat_file(tree, compressSequenceNames = True):
         # --------------------------
         # Print sequences
         # --------------------------
-        Q_raw = list(filter(lambda q: q != {}, map(lambda n: n.base_node.getSequence(p), all_nodes)))
+        Q_raw = list(filter(lambda q: q != {}, map(lambda n: n.getSequence(p), all_nodes)))
 
         # Remove duplicates
         Q = [{}] + [dict(t) for t in {tuple(d.items()) for d in Q_raw}]
@@ -80,7 +80,7 @@ def tree_to_colgen_dat_file(tree, compressSequenceNames = True):
         s += ":=\nempty_is_" + str(p+1) + " 1" + (" 0" * (len(Q)-1)) + "\n"
         for h in H:
             s += str(h.id) + " "
-            h_seq = h.nodes[0].base_node.getSequence(p)
+            h_seq = h.nodes[0].getSequence(p)
             h_next_sequences = []
             for a in range(h.action_count):
                 seq_copy = h_seq.copy()